@@ -1,8 +1,69 @@
 from dataclasses import dataclass, field
+import functools
+import inspect
 from typing import Any, Dict, List, Text
+from actions.logger import LOG_SENDER_ID, log_metrics
+from ej.retry import action_deadline
+from ej.settings import EJ_VOTE_OUTBOX, get_action_budget
 from ej.vote import SlotsType
+from ej.vote_outbox import VOTE_OUTBOX
 
 from ej.user import User
+from rasa_sdk.events import SlotSet
+
+TOKEN_SLOTS = ("access_token", "refresh_token")
+
+
+def get_action_name(action) -> str:
+    if hasattr(action, "name"):
+        return action.name()
+    return action.__class__.__name__
+
+
+def ej_action(method):
+    """
+    Decorates an action coroutine (run or validate_<slot>) that communicates with EJ.
+
+    - every EJ request sent by the action shares the same time budget (see
+      get_action_budget), and the action duration is recorded in METRICS;
+    - tokens refreshed by EjClient during the action are returned with the action slots,
+      so Rasa stores them and the next actions don't need to refresh them again;
+    - the action logs are sampled by the participant sender_id (see custom_logger);
+    - the first action starts sending the votes left in the outbox (see
+      VoteOutbox.resume);
+    - the integration METRICS are logged periodically (see log_metrics).
+    """
+    signature = inspect.signature(method)
+
+    @functools.wraps(method)
+    async def wrapper(*args, **kwargs):
+        arguments = signature.bind(*args, **kwargs).arguments
+        tracker = arguments.get("tracker")
+        action_name = get_action_name(arguments.get("self"))
+        tokens = {slot: tracker.get_slot(slot) for slot in TOKEN_SLOTS}
+        if EJ_VOTE_OUTBOX:
+            VOTE_OUTBOX.resume()
+        sender_id = LOG_SENDER_ID.set(tracker.sender_id)
+        try:
+            with action_deadline(get_action_budget(action_name), action_name):
+                slots = await method(*args, **kwargs)
+        finally:
+            LOG_SENDER_ID.reset(sender_id)
+            log_metrics()
+        refreshed_tokens = {
+            slot: tracker.get_slot(slot)
+            for slot in TOKEN_SLOTS
+            if tracker.get_slot(slot) != tokens[slot]
+        }
+        if not refreshed_tokens:
+            return slots
+        if isinstance(slots, dict):
+            return {**slots, **refreshed_tokens}
+        return list(slots or []) + [
+            SlotSet(slot, value) for slot, value in refreshed_tokens.items()
+        ]
+
+    return wrapper
 
 
 class CheckersMixin:
@@ -34,7 +95,7 @@ class CheckSlotsInterface:
     def __repr__(self):
         return f"Checker: {self.__class__.__name__}"
 
-    def has_slots_to_return(self) -> bool:
+    async def has_slots_to_return(self) -> bool:
         """
         Returns True if the dialogue slots has to be updated.
         If True, the slots field must be updated with the corresponding SlotSet or FollowupAction.
@@ -14,14 +14,14 @@ class CheckNextProfileQuestionSlots(CheckSlotsInterface):
     Request to EJ API the next comment to vote and update the user statistics slots.
     """
 
-    def has_slots_to_return(self) -> bool:
-        profile = Profile(self.tracker)
-
+    async def has_slots_to_return(self) -> bool:
         try:
+            profile = await Profile.get(self.tracker)
             message, id = profile.get_next_question()
         except EJCommunicationError:
             ej_client_error_manager = EJClientErrorManager()
-            return ej_client_error_manager.get_slots()
+            self.slots = ej_client_error_manager.get_slots()
+            return True
 
         self._dispatch_messages(message)
         self._set_slots(id)
@@ -41,13 +41,20 @@ class CheckNextProfileQuestionSlots(CheckSlotsInterface):
 
 
 class CheckValidateProfileQuestion(CheckSlotsInterface):
-    def has_slots_to_return(self) -> bool:
-        profile = Profile(self.tracker)
+    async def has_slots_to_return(self) -> bool:
         profile_question_id = self.tracker.get_slot("profile_question_id")
         if profile_question_id:
             profile_question_id = int(profile_question_id)
 
-        response, err = profile.is_valid_answer(self.slot_value, profile_question_id)
+        try:
+            profile = await Profile.get(self.tracker)
+            response, err = await profile.is_valid_answer(
+                self.slot_value, profile_question_id
+            )
+        except EJCommunicationError:
+            ej_client_error_manager = EJClientErrorManager()
+            self.slots = ej_client_error_manager.get_slots(as_dict=True)
+            return True
 
         if not response:
             if err:
@@ -11,11 +11,18 @@ from ej.settings import EJCommunicationError, BOARD_ID, CONVERSATION_ID
 
 
 def get_slots(conversation: Conversation, user: User):
-    authentication_manager = ExternalAuthenticationManager(
-        user.tracker.sender_id, user.secret_id
-    )
-    return [
-        SlotSet("auth_link", authentication_manager.get_authentication_link()),
+    slots = []
+    # the authentication link is signed only if it may be sent to the participant.
+    if Conversation.user_can_be_asked_to_authenticate(
+        user.has_completed_registration, conversation.anonymous_votes_limit
+    ):
+        authentication_manager = ExternalAuthenticationManager(
+            user.tracker.sender_id, user.secret_id
+        )
+        slots.append(
+            SlotSet("auth_link", authentication_manager.get_authentication_link())
+        )
+    return slots + [
         SlotSet("conversation_id", conversation.id),
         SlotSet("conversation_text", conversation.text),
         SlotSet("anonymous_votes_limit", conversation.anonymous_votes_limit),
@@ -40,11 +47,11 @@ def get_slots(conversation: Conversation, user: User):
 
 @dataclass
 class CheckGetConversationSlots(CheckSlotsInterface):
-    def has_slots_to_return(self) -> bool:
+    async def has_slots_to_return(self) -> bool:
         """ """
         if CONVERSATION_ID is not None:
             try:
-                conversation_data = Conversation.get(
+                conversation_data = await Conversation.get(
                     int(CONVERSATION_ID), self.user.tracker
                 )
                 conversation = Conversation(self.user.tracker, conversation_data)
@@ -61,7 +68,7 @@ class CheckGetConversationSlots(CheckSlotsInterface):
 
 @dataclass
 class CheckGetBoardSlots(CheckSlotsInterface):
-    def has_slots_to_return(self) -> bool:
+    async def has_slots_to_return(self) -> bool:
         """ """
         ej_client_error_manager = EJClientErrorManager()
 
@@ -71,7 +78,7 @@ class CheckGetBoardSlots(CheckSlotsInterface):
             return True
 
         try:
-            board = Board(int(BOARD_ID), self.user.tracker)
+            board = await Board.get(int(BOARD_ID), self.user.tracker)
             if len(board.conversations) == 0:
                 self.dispatcher.utter_message(response="utter_no_conversations")
                 raise Exception("No conversations found.")
@@ -16,7 +16,7 @@ class CheckRemainingCommentsSlots(CheckSlotsInterface):
     Check if after a vote, still exists an next comment to vote.
     """
 
-    def has_slots_to_return(self) -> bool:
+    async def has_slots_to_return(self) -> bool:
         available_comments_exists = Conversation.available_comments_to_vote(
             self.conversation_statistics
         )
@@ -39,9 +39,9 @@ class CheckNextCommentSlots(CheckSlotsInterface):
     Request to EJ API the next comment to vote and update the user statistics slots.
     """
 
-    def has_slots_to_return(self) -> bool:
+    async def has_slots_to_return(self) -> bool:
         try:
-            comment = self.conversation.get_next_comment()
+            comment = await self.conversation.get_next_comment()
             if comment:
                 self.set_slots(comment)
             else:
@@ -89,9 +89,15 @@ class CheckNeedToAskAboutProfile(CheckSlotsInterface):
     Verify if the user needs to answer profile questions.
     """
 
-    def has_slots_to_return(self) -> bool:
+    async def has_slots_to_return(self) -> bool:
+        # The profile is only requested if a profile question could be sent now.
+        could_be_due, _ = Profile.question_could_be_due(
+            self.conversation, self.conversation_statistics, self.tracker
+        )
+        if not could_be_due:
+            return False
         try:
-            profile = Profile(self.tracker)
+            profile = await Profile.get(self.tracker)
         except EJCommunicationError:
             ej_client_error_manager = EJClientErrorManager()
             self.slots = ej_client_error_manager.get_slots()
@@ -128,7 +134,7 @@ class CheckExternalAuthenticationSlots(CheckSlotsInterface):
     Test if the user has reached the anonymous vote limit and needs to authenticate.
     """
 
-    def has_slots_to_return(self) -> bool:
+    async def has_slots_to_return(self) -> bool:
         has_completed_registration = self.tracker.get_slot("has_completed_registration")
         anonymous_votes_limit = int(self.tracker.get_slot("anonymous_votes_limit"))
         if Conversation.user_should_authenticate(
@@ -159,7 +165,7 @@ class CheckUserCommentSlots(CheckSlotsInterface):
     Test if the user has voted in all available comments.
     """
 
-    def has_slots_to_return(self) -> bool:
+    async def has_slots_to_return(self) -> bool:
         if not Conversation.available_comments_to_vote(self.conversation_statistics):
             self._dispatch_messages()
             self.set_slots()
@@ -179,7 +185,7 @@ class CheckUserCanAddCommentsSlots(CheckSlotsInterface):
     Test if the user can add comments to the conversation.
     """
 
-    def has_slots_to_return(self) -> bool:
+    async def has_slots_to_return(self) -> bool:
         if Conversation.user_can_add_comment(
             self.conversation_statistics, self.tracker
         ):
@@ -1,6 +1,6 @@
 from typing import Any, Dict, List, Text
 
-from actions.base_actions import CheckersMixin
+from actions.base_actions import CheckersMixin, ej_action
 from ej.comment import Comment, CommentDialogue
 from rasa_sdk import Action, FormValidationAction, Tracker
 from rasa_sdk.events import EventType
@@ -19,7 +19,7 @@ class ActionAskComment(Action, CheckersMixin):
     def name(self) -> Text:
         return "action_ask_comment"
 
-    def run(
+    async def run(
         self, dispatcher: CollectingDispatcher, tracker: Tracker, domain: Dict
     ) -> List[EventType]:
         dispatcher.utter_message(response="utter_ask_comment")
@@ -41,7 +41,8 @@ class ValidateCommentForm(FormValidationAction):
             return CommentDialogue.deactivate_comment_form()
         return {"comment_confirmation": slot_value}
 
-    def validate_comment(
+    @ej_action
+    async def validate_comment(
         self,
         slot_value: Any,
         dispatcher: CollectingDispatcher,
@@ -53,7 +54,7 @@ class ValidateCommentForm(FormValidationAction):
         comment = Comment(conversation_id, user_comment, tracker)
 
         try:
-            comment.create()
+            await comment.create()
             dispatcher.utter_message(response="utter_sent_comment")
             return {"vote": None}
         except:
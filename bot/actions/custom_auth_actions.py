@@ -1,7 +1,10 @@
 from typing import Any, Dict, List, Text
 
+from actions.base_actions import ej_action
+from actions.checkers.api_error_checker import EJClientErrorManager
 from ej.conversation import Conversation
-from ej.settings import EJCommunicationError
+from ej.cache import PROFILE_CACHE
+from ej.settings import EJ_EXTERNAL_AUTHENTICATION_WEBHOOK, EJCommunicationError
 from ej.auth import CheckAuthenticationDialogue, ExternalAuthenticationManager
 from ej.user import User
 from rasa_sdk import Action, FormValidationAction, Tracker
@@ -23,7 +26,8 @@ class ValidateAuthenticationForm(FormValidationAction):
     ) -> Dict[Text, Any]:
         return {}
 
-    def validate_check_authentication(
+    @ej_action
+    async def validate_check_authentication(
         self,
         slot_value: Any,
         dispatcher: CollectingDispatcher,
@@ -36,10 +40,24 @@ class ValidateAuthenticationForm(FormValidationAction):
         if CheckAuthenticationDialogue.participant_refuses_to_auth(slot_value):
             return CheckAuthenticationDialogue.end_auth_form()
 
+        # the webhook sets has_completed_registration once the participant completes the
+        # external authentication, so EJ is not requested before it.
+        if EJ_EXTERNAL_AUTHENTICATION_WEBHOOK and not tracker.get_slot(
+            "has_completed_registration"
+        ):
+            dispatcher.utter_message(
+                response="utter_error_during_authentication_validation"
+            )
+            return CheckAuthenticationDialogue.restart_auth_form()
+
         user = User(tracker)
         user.tracker.slots["access_token"] = ""
         user.tracker.slots["refresh_token"] = ""
-        user.authenticate()
+        try:
+            await user.authenticate()
+        except EJCommunicationError:
+            ej_client_error_manager = EJClientErrorManager()
+            return ej_client_error_manager.get_slots(as_dict=True)
 
         if not user.has_completed_registration:
             dispatcher.utter_message(
@@ -47,6 +65,8 @@ class ValidateAuthenticationForm(FormValidationAction):
             )
             return CheckAuthenticationDialogue.restart_auth_form()
 
+        # the participant is now authenticated as another EJ user.
+        PROFILE_CACHE.invalidate(tracker.sender_id)
         conversation = Conversation(user.tracker)
         return self._get_slots(user, conversation)
 
@@ -64,7 +84,7 @@ class ActionAskHasCompletedRegistration(Action):
     def name(self) -> Text:
         return "action_ask_check_authentication"
 
-    def run(
+    async def run(
         self, dispatcher: CollectingDispatcher, tracker: Tracker, domain: Dict
     ) -> List[EventType]:
         try:
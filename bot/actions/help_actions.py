@@ -17,7 +17,7 @@ class ResetHelpFormSlots(Action):
     def name(self):
         return "action_reset_help_slots"
 
-    def run(self, dispatcher, tracker, domain):
+    async def run(self, dispatcher, tracker, domain):
         return [SlotSet("help_topic", None)]
 
 
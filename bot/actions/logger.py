@@ -1,12 +1,135 @@
+import atexit
+from contextvars import ContextVar
+import hashlib
 import json
 import logging
+from logging.handlers import QueueHandler, QueueListener
+import queue
+import time
+
+from ej.metrics import METRICS
+from ej.settings import (
+    EJ_LOG_QUEUE,
+    EJ_LOG_REDACT,
+    EJ_LOG_SAMPLE_RATE,
+    EJ_METRICS_LOG_INTERVAL,
+)
 
 logger = logging.getLogger(__name__)
 
+# Participant of the action (or webhook request) being handled, used to sample the logs.
+LOG_SENDER_ID: ContextVar = ContextVar("LOG_SENDER_ID", default=None)
+
+REDACTED = "[REDACTED]"
+SENSITIVE_KEYS = {
+    "password",
+    "password_confirm",
+    "access_token",
+    "refresh_token",
+    "access",
+    "refresh",
+    "token",
+    "secret_id",
+    "user_data",
+    "authorization",
+}
+
+
+def redact(data):
+    """
+    Returns a copy of data with the values of SENSITIVE_KEYS replaced by REDACTED.
+    """
+    if isinstance(data, dict):
+        return {
+            key: REDACTED if str(key).lower() in SENSITIVE_KEYS else redact(value)
+            for key, value in data.items()
+        }
+    if isinstance(data, (list, tuple)):
+        return [redact(value) for value in data]
+    return data
+
+
+def is_sampled(sender_id) -> bool:
+    """
+    Returns True if the logs of a participant are written. Participants are sampled as a
+    whole (EJ_LOG_SAMPLE_RATE), so their logs can be followed along the conversation.
+    """
+    if sender_id is None or EJ_LOG_SAMPLE_RATE >= 1:
+        return True
+    digest = hashlib.sha1(str(sender_id).encode()).digest()
+    return int.from_bytes(digest[:4], "big") / 2**32 < EJ_LOG_SAMPLE_RATE
+
+
+class LogData:
+    """
+    Formats the data of a log record only when the record is written.
+    """
+
+    def __init__(self, data):
+        self.data = data
+
+    def __str__(self):
+        data = self.data() if callable(self.data) else self.data
+        if isinstance(data, (str, bytes)):
+            try:
+                data = json.loads(data)
+            except ValueError:
+                return data if isinstance(data, str) else data.decode(errors="replace")
+        if EJ_LOG_REDACT:
+            data = redact(data)
+        return json.dumps(data, indent=4, default=str)
 
-def custom_logger(message, data={}, _type="json"):
-    format = f"EJ INTEGRATION DEBUGGING - {message}"
+
+def custom_logger(message, data={}, _type="json", sender_id=None):
+    """
+    Logs an EJ integration debug message. Nothing is formatted if DEBUG is disabled or
+    the participant is not sampled. data may be a callable, called only when the message
+    is written, and the passwords and tokens in it are redacted (see EJ_LOG_REDACT).
+    """
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+    if not is_sampled(sender_id if sender_id is not None else LOG_SENDER_ID.get()):
+        return
     if _type == "json" and data:
-        logger.debug(f"{format}: \n {json.dumps(data, indent=4)}")
+        logger.debug("EJ INTEGRATION DEBUGGING - %s: \n %s", message, LogData(data))
     else:
-        logger.debug(f"{format}")
+        logger.debug("EJ INTEGRATION DEBUGGING - %s", message)
+
+
+_metrics_logged_at = time.monotonic()
+
+
+def log_metrics():
+    """
+    Logs a snapshot of the EJ integration METRICS (INFO level), at most once every
+    EJ_METRICS_LOG_INTERVAL seconds. The snapshot is only taken when it is written.
+    """
+    global _metrics_logged_at
+    if not EJ_METRICS_LOG_INTERVAL or not logger.isEnabledFor(logging.INFO):
+        return
+    now = time.monotonic()
+    if now - _metrics_logged_at < EJ_METRICS_LOG_INTERVAL:
+        return
+    _metrics_logged_at = now
+    logger.info("EJ INTEGRATION METRICS: \n %s", LogData(METRICS.snapshot))
+
+
+def start_queue_handler():
+    """
+    Writes the EJ integration logs from a background thread, through the handlers of the
+    root logger, so the actions don't wait for the log I/O.
+    """
+    handlers = logging.getLogger().handlers
+    if not EJ_LOG_QUEUE or not logger.isEnabledFor(logging.DEBUG):
+        return
+    if not handlers or logger.handlers:
+        return
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    logger.addHandler(QueueHandler(log_queue))
+    logger.propagate = False
+    listener.start()
+    atexit.register(listener.stop)
+
+
+start_queue_handler()
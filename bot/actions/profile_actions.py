@@ -1,5 +1,6 @@
 from typing import Any, Dict, List, Text
 
+from actions.base_actions import ej_action
 from actions.checkers.profile_actions_checkers import (
     CheckNextProfileQuestionSlots,
     CheckValidateProfileQuestion,
@@ -20,7 +21,8 @@ class ActionAskProfileQuestion(Action):
     def name(self) -> Text:
         return "action_ask_profile_question"
 
-    def run(
+    @ej_action
+    async def run(
         self, dispatcher: CollectingDispatcher, tracker: Tracker, domain: Dict
     ) -> List[EventType]:
 
@@ -32,7 +34,7 @@ class ActionAskProfileQuestion(Action):
         )
 
         for checker in action_checkers:
-            if checker.has_slots_to_return():
+            if await checker.has_slots_to_return():
                 self.slots = checker.slots
                 break
 
@@ -54,7 +56,8 @@ class ValidateProfileForm(FormValidationAction):
     def name(self) -> Text:
         return "validate_profile_form"
 
-    def validate_profile_question(
+    @ej_action
+    async def validate_profile_question(
         self,
         slot_value: Any,
         dispatcher: CollectingDispatcher,
@@ -62,7 +65,7 @@ class ValidateProfileForm(FormValidationAction):
         domain: DomainDict,
     ) -> Dict[Text, Any]:
         custom_logger("validate_profile_question")
-        custom_logger(f"slot_value: {slot_value}")
+        custom_logger("slot_value", data=lambda: {"slot_value": slot_value})
 
         if not slot_value:
             return {}
@@ -72,10 +75,10 @@ class ValidateProfileForm(FormValidationAction):
         )
 
         for checker in action_checkers:
-            if checker.has_slots_to_return():
+            if await checker.has_slots_to_return():
                 self.slots = checker.slots
 
-        custom_logger(f"slots: {self.slots}")
+        custom_logger("slots", data=lambda: self.slots)
         return self.slots
 
     def get_checkers(self, tracker, **kwargs) -> list:
@@ -1,7 +1,10 @@
+from actions.base_actions import ej_action
+from actions.checkers.api_error_checker import EJClientErrorManager
 from actions.checkers.setup_actions_checkers import (
     CheckGetBoardSlots,
     CheckGetConversationSlots,
 )
+from ej.settings import EJCommunicationError
 from ej.vote import SlotsType
 from ej.user import User
 from rasa_sdk import Action
@@ -16,15 +19,20 @@ class ActionGetConversation(Action):
     def name(self):
         return "action_get_conversation"
 
-    def run(self, dispatcher, tracker, domain):
+    @ej_action
+    async def run(self, dispatcher, tracker, domain):
         user = User(tracker)
-        user.authenticate()
+        try:
+            await user.authenticate()
+        except EJCommunicationError:
+            ej_client_error_manager = EJClientErrorManager()
+            return ej_client_error_manager.get_slots()
 
         self.slots = []
 
         checkers = self.get_checkers(tracker, user=user, dispatcher=dispatcher)
         for checker in checkers:
-            if checker.has_slots_to_return():
+            if await checker.has_slots_to_return():
                 self.slots = checker.slots
                 break
 
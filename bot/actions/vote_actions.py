@@ -1,6 +1,7 @@
+import asyncio
 from typing import Any, Dict, List, Text
 
-from actions.base_actions import CheckersMixin
+from actions.base_actions import CheckersMixin, ej_action
 from actions.checkers.api_error_checker import EJClientErrorManager
 from actions.checkers.vote_actions_checkers import (
     CheckRemainingCommentsSlots,
@@ -31,12 +32,13 @@ class ActionAskVote(Action, CheckersMixin):
     def name(self) -> Text:
         return "action_ask_vote"
 
-    def run(
+    @ej_action
+    async def run(
         self, dispatcher: CollectingDispatcher, tracker: Tracker, domain: Dict
     ) -> List[EventType]:
         conversation = Conversation(tracker)
         try:
-            conversation_statistics = conversation.get_participant_statistics()
+            conversation_statistics = await conversation.get_participant_statistics()
         except EJCommunicationError:
             ej_client_error_manager = EJClientErrorManager()
             return ej_client_error_manager.get_slots()
@@ -51,7 +53,7 @@ class ActionAskVote(Action, CheckersMixin):
         )
 
         for checker in action_chekers:
-            if checker.has_slots_to_return():
+            if await checker.has_slots_to_return():
                 custom_logger(checker, _type="string")
                 self.slots = checker.slots
                 break
@@ -95,7 +97,8 @@ class ValidateVoteForm(FormValidationAction):
     def name(self) -> Text:
         return "validate_vote_form"
 
-    def run(
+    @ej_action
+    async def run(
         self, dispatcher: CollectingDispatcher, tracker: Tracker, domain: Dict
     ) -> List[EventType]:
         user_voted_comments = tracker.get_slot("user_voted_comments")
@@ -104,7 +107,7 @@ class ValidateVoteForm(FormValidationAction):
             ej_client_error_manager = EJClientErrorManager()
 
             try:
-                statistics = conversation.get_participant_statistics()
+                statistics = await conversation.get_participant_statistics()
             except EJCommunicationError:
                 return ej_client_error_manager.get_slots(as_dict=True)
 
@@ -114,16 +117,16 @@ class ValidateVoteForm(FormValidationAction):
                 slots_type=SlotsType.LIST,
             )
 
-            if checker.has_slots_to_return():
+            if await checker.has_slots_to_return():
                 custom_logger(checker, _type="string")
                 if checker.slots == VoteDialogue.restart_vote_form_slots():
-                    return super().run(dispatcher, tracker, domain)
+                    return await super().run(dispatcher, tracker, domain)
                 else:
                     return checker.slots
 
-        return super().run(dispatcher, tracker, domain)
+        return await super().run(dispatcher, tracker, domain)
 
-    def validate_vote(
+    async def validate_vote(
         self,
         slot_value: Any,
         dispatcher: CollectingDispatcher,
@@ -141,15 +144,24 @@ class ValidateVoteForm(FormValidationAction):
 
         if Vote.is_valid(slot_value):
             vote = Vote(slot_value, tracker)
-            custom_logger(f"POST vote to EJ API: {vote}")
+            comment_id = tracker.get_slot("current_comment_id")
+            custom_logger(
+                "POST vote to EJ API",
+                data=lambda: {"comment": comment_id, "choice": vote.vote_slot_value},
+            )
 
+            # The participant comment queue, used by ActionAskVote, is refilled
+            # while the vote is sent.
             try:
-                vote.create(tracker.get_slot("current_comment_id"))
+                await asyncio.gather(
+                    vote.create(comment_id),
+                    conversation.prefetch_next_comment(comment_id),
+                )
             except EJCommunicationError:
                 return ej_client_error_manager.get_slots(as_dict=True)
 
             try:
-                statistics = conversation.get_participant_statistics()
+                statistics = await conversation.get_participant_statistics()
             except EJCommunicationError:
                 return ej_client_error_manager.get_slots(as_dict=True)
 
@@ -164,7 +176,7 @@ class ValidateVoteForm(FormValidationAction):
 
             for checker in checkers:
                 custom_logger(checker, _type="string")
-                if checker.has_slots_to_return():
+                if await checker.has_slots_to_return():
                     self.slots = checker.slots
                     break
             return self.slots
@@ -50,7 +50,11 @@ class WhatsApp(InputChannel):
             if type(whatsapp_message) is NotSupportedMessage:
                 return HTTPResponse("ok", status=200)
 
-            custom_logger("WHATSAPP EVENT", request.json)
+            custom_logger(
+                "WHATSAPP EVENT",
+                request.json,
+                sender_id=whatsapp_event.contact.phone,
+            )
 
             # send message to Rasa
             collector = CollectingOutputChannel()
@@ -78,7 +82,7 @@ class WhatsApp(InputChannel):
             for message in wpp_messages:
                 response = wpp_client.send_message(message)
                 if response.status_code != 200:
-                    custom_logger("WHATSAPP EVENT ERROR", response.json())
+                    custom_logger("WHATSAPP EVENT ERROR", response.json)
 
             return HTTPResponse("ok", status=200)
 
@@ -0,0 +1,76 @@
+import inspect
+from typing import Any, Awaitable, Callable, Dict, Optional, Text
+
+from actions.logger import custom_logger
+from ej.auth import InvalidWebhookNotification, read_webhook_notification
+from rasa.core.channels.channel import InputChannel, UserMessage
+from rasa.shared.core.events import SlotSet
+from sanic import Blueprint
+from sanic.request import Request
+from sanic.response import HTTPResponse
+
+
+class ExternalAuthentication(InputChannel):
+    """
+    Receives from Brasil Participativo the confirmation that a participant completed the
+    external authentication. The request body carries the user_data JWT of the
+    participant authentication link and is signed with the webhook_secret credential
+    (see read_webhook_notification). The has_completed_registration slot is then set in
+    the participant tracker, so validate_check_authentication doesn't request EJ before
+    it (see EJ_EXTERNAL_AUTHENTICATION_WEBHOOK).
+    """
+
+    SIGNATURE_HEADER = "X-Webhook-Signature"
+
+    def __init__(self, webhook_secret: Optional[Text] = None) -> None:
+        self.webhook_secret = webhook_secret
+
+    @classmethod
+    def from_credentials(cls, credentials: Optional[Dict[Text, Any]]) -> InputChannel:
+        if not credentials:
+            return cls()
+        return cls(credentials.get("webhook_secret"))
+
+    def name(self) -> Text:
+        return "external_authentication"
+
+    def blueprint(
+        self, on_new_message: Callable[[UserMessage], Awaitable[None]]
+    ) -> Blueprint:
+        custom_webhook = Blueprint(
+            "custom_webhook_{}".format(type(self).__name__),
+            inspect.getmodule(self).__name__,
+        )
+
+        @custom_webhook.route("/", methods=["GET"])
+        async def health(request: Request) -> HTTPResponse:
+            return HTTPResponse("ok", status=200)
+
+        @custom_webhook.route("/webhook", methods=["POST"])
+        async def receive(request: Request) -> HTTPResponse:
+            try:
+                authentication_manager = read_webhook_notification(
+                    self.webhook_secret,
+                    request.body,
+                    request.headers.get(self.SIGNATURE_HEADER),
+                )
+            except InvalidWebhookNotification as error:
+                custom_logger(
+                    "INVALID EXTERNAL AUTHENTICATION NOTIFICATION",
+                    data=str(error.__cause__ or error),
+                )
+                return HTTPResponse(str(error), status=401)
+
+            agent = request.app.ctx.agent
+            if agent is None:
+                return HTTPResponse("Bot not ready", status=503)
+
+            sender_id = authentication_manager.sender_id
+            async with agent.lock_store.lock(sender_id):
+                tracker = await agent.tracker_store.get_or_create_tracker(sender_id)
+                tracker.update(SlotSet("has_completed_registration", True))
+                await agent.tracker_store.save(tracker)
+            custom_logger("EXTERNAL AUTHENTICATION COMPLETED", sender_id=sender_id)
+            return HTTPResponse("ok", status=200)
+
+        return custom_webhook
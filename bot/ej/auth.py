@@ -2,10 +2,13 @@ from dataclasses import dataclass
 from datetime import datetime, timezone
 from datetime import timedelta
 import hashlib
-from typing import Dict, Text
+import hmac
+import json
+from typing import Dict, Optional, Text
 
 import jwt
 
+from .cache import AUTH_LINK_CACHE
 from .settings import (
     BP_EJ_COMPONENT_ID,
     EXTERNAL_AUTHENTICATION_HOST,
@@ -57,9 +60,18 @@ class ExternalAuthenticationManager:
     secret_id: Text
 
     def get_authentication_link(self):
-        jwt_data = self._get_jwt_authorization_data()
-        authorization_url = self._get_authorization_url()
-        return f"{authorization_url}?user_data={jwt_data}"
+        """
+        Returns the participant authentication link. The link is signed once and reused
+        until shortly before it expires (see AUTH_LINK_CACHE).
+        """
+        key = (self.sender_id, self.secret_id)
+        authentication_link = AUTH_LINK_CACHE.get(key)
+        if authentication_link is None:
+            jwt_data = self._get_jwt_authorization_data()
+            authorization_url = self._get_authorization_url()
+            authentication_link = f"{authorization_url}?user_data={jwt_data}"
+            AUTH_LINK_CACHE.set(key, authentication_link)
+        return authentication_link
 
     def _get_jwt_authorization_data(
         self,
@@ -82,6 +94,28 @@ class ExternalAuthenticationManager:
         }
         return jwt.encode(data, JWT_SECRET, algorithm="HS256")
 
+    @staticmethod
+    def from_authorization_data(jwt_data: Text) -> "ExternalAuthenticationManager":
+        """
+        Returns the manager of the participant of a JWT generated by
+        _get_jwt_authorization_data and sent back by Brasil Participativo. Raises
+        jwt.InvalidTokenError if the JWT is not valid, has expired or its secret_id is
+        not the one of its user_id.
+        """
+        if not JWT_SECRET:
+            raise Exception("JWT_SECRET variable not found.")
+
+        data = jwt.decode(
+            jwt_data,
+            JWT_SECRET,
+            algorithms=["HS256"],
+            options={"require": ["exp", "user_id", "secret_id"]},
+        )
+        sender_id = str(data["user_id"])
+        if data["secret_id"] != ExternalAuthenticationManager.to_sha256(sender_id):
+            raise jwt.InvalidTokenError("secret_id does not match the user_id.")
+        return ExternalAuthenticationManager(sender_id, data["secret_id"])
+
     def _get_authorization_url(self) -> Text:
         """
         Returns an URL to authenticate the user using the JWT authorization data.
@@ -101,3 +135,39 @@ class ExternalAuthenticationManager:
         hash_object = hashlib.sha256(sender_id.encode())
         hex_dig = hash_object.hexdigest()
         return hex_dig
+
+
+def verify_webhook_signature(
+    secret: Optional[Text], body: bytes, signature: Optional[Text]
+) -> bool:
+    """
+    Returns True if signature is the "sha256=<hex digest>" HMAC-SHA256 of the request
+    body with the webhook secret shared with Brasil Participativo. The user_data JWT is
+    not enough to authenticate a notification, since it is in the authentication link
+    sent to the participant.
+    """
+    if not secret or not signature:
+        return False
+    digest = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(signature, f"sha256={digest}")
+
+
+class InvalidWebhookNotification(Exception):
+    """Raised when an external authentication notification can't be trusted"""
+
+
+def read_webhook_notification(
+    secret: Optional[Text], body: bytes, signature: Optional[Text]
+) -> ExternalAuthenticationManager:
+    """
+    Returns the manager of the participant of an external authentication notification
+    sent by Brasil Participativo. Raises InvalidWebhookNotification if the body is not
+    signed with the webhook secret, or its user_data JWT is not valid.
+    """
+    if not verify_webhook_signature(secret, body, signature):
+        raise InvalidWebhookNotification("Invalid signature")
+    try:
+        user_data = json.loads(body).get("user_data")
+        return ExternalAuthenticationManager.from_authorization_data(user_data)
+    except Exception as error:
+        raise InvalidWebhookNotification("Invalid user_data") from error
@@ -1,3 +1,4 @@
+from .cache import METADATA_CACHE
 from .conversation import Conversation
 from .ej_client import EjClient
 from .routes import board_route
@@ -6,12 +7,24 @@ from .routes import board_route
 class Board:
     def __init__(self, id, tracker):
         self.id = id
+        self.title = None
+        self.description = None
         self.conversations: Conversation = []
         self.ej_client = EjClient(tracker)
-        self._set_board(tracker)
 
-    def _set_board(self, tracker):
-        response = self.ej_client.request(board_route(self.id))
+    @classmethod
+    async def get(cls, id, tracker):
+        """
+        Returns a Board populated with the EJ API board data.
+        """
+        board = cls(id, tracker)
+        await board._set_board(tracker)
+        return board
+
+    async def _set_board(self, tracker):
+        response = await self.ej_client.request(
+            board_route(self.id), cache=METADATA_CACHE
+        )
         data = response.json()
         self.title = data.get("title")
         self.description = data.get("description")
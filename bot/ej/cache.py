@@ -0,0 +1,114 @@
+from collections import OrderedDict
+import time
+from typing import Any, Hashable
+
+from .metrics import METRICS
+from .settings import (
+    EJ_AUTH_LINK_CACHE_SIZE,
+    EJ_AUTH_LINK_REFRESH_MARGIN,
+    EJ_COMMENT_CACHE_SIZE,
+    EJ_COMMENT_CACHE_TTL,
+    EJ_METADATA_CACHE_SIZE,
+    EJ_METADATA_CACHE_TTL,
+    EJ_PROFILE_CACHE_SIZE,
+    EJ_PROFILE_CACHE_TTL,
+    EJ_REGISTERED_PARTICIPANTS_CACHE_SIZE,
+    EJ_REGISTERED_PARTICIPANTS_CACHE_TTL,
+    EJ_STATISTICS_CACHE_SIZE,
+    EJ_STATISTICS_CACHE_TTL,
+    EJ_SUBMITTED_VOTES_CACHE_SIZE,
+    EJ_SUBMITTED_VOTES_CACHE_TTL,
+    TOKEN_EXPIRATION_TIME,
+)
+
+
+class TTLCache:
+    """
+    Process-level cache with a bounded number of entries. Entries expire ttl seconds
+    after being stored, and the least recently used entry is evicted when the cache is
+    full. Hits, misses and evictions are counted in METRICS, labeled by the cache name.
+    """
+
+    def __init__(self, name: str, maxsize: int, ttl: float):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            self._entries.pop(key, None)
+            METRICS.increment("ej_cache_misses", cache=self.name)
+            return default
+        self._entries.move_to_end(key)
+        METRICS.increment("ej_cache_hits", cache=self.name)
+        return entry[1]
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Returns the entry of key, as get(), removing it from the cache.
+        """
+        value = self.get(key, default)
+        self._entries.pop(key, None)
+        return value
+
+    def set(self, key: Hashable, value: Any):
+        if self.maxsize <= 0:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            METRICS.increment("ej_cache_evictions", cache=self.name)
+
+    def invalidate(self, key: Hashable):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+
+# Conversations and boards data, which is the same for every participant.
+METADATA_CACHE = TTLCache(
+    "metadata", maxsize=EJ_METADATA_CACHE_SIZE, ttl=EJ_METADATA_CACHE_TTL
+)
+
+# sender_ids of the participants registered in EJ.
+REGISTERED_PARTICIPANTS = TTLCache(
+    "registered_participants",
+    maxsize=EJ_REGISTERED_PARTICIPANTS_CACHE_SIZE,
+    ttl=EJ_REGISTERED_PARTICIPANTS_CACHE_TTL,
+)
+
+# Signed external authentication links, by sender_id and secret_id.
+AUTH_LINK_CACHE = TTLCache(
+    "auth_link",
+    maxsize=EJ_AUTH_LINK_CACHE_SIZE,
+    ttl=TOKEN_EXPIRATION_TIME.total_seconds() - EJ_AUTH_LINK_REFRESH_MARGIN,
+)
+
+# Participants profile data, by sender_id.
+PROFILE_CACHE = TTLCache(
+    "profile", maxsize=EJ_PROFILE_CACHE_SIZE, ttl=EJ_PROFILE_CACHE_TTL
+)
+
+# Comments content, by comment id, shared by every participant.
+COMMENT_CACHE = TTLCache(
+    "comment", maxsize=EJ_COMMENT_CACHE_SIZE, ttl=EJ_COMMENT_CACHE_TTL
+)
+
+# Participants statistics (ParticipationCounters), by sender_id and conversation id.
+STATISTICS_CACHE = TTLCache(
+    "statistics", maxsize=EJ_STATISTICS_CACHE_SIZE, ttl=EJ_STATISTICS_CACHE_TTL
+)
+
+# Votes sent by the participants, by sender_id, conversation id and comment id.
+SUBMITTED_VOTES = TTLCache(
+    "submitted_votes",
+    maxsize=EJ_SUBMITTED_VOTES_CACHE_SIZE,
+    ttl=EJ_SUBMITTED_VOTES_CACHE_TTL,
+)
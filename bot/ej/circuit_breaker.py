@@ -0,0 +1,74 @@
+from dataclasses import dataclass, field
+import time
+
+from .settings import (
+    EJ_CIRCUIT_FAILURE_THRESHOLD,
+    EJ_CIRCUIT_RESET_TIMEOUT,
+    EJ_CIRCUIT_SLOW_CALL_DURATION,
+    EJCircuitOpenError,
+)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+@dataclass
+class CircuitBreaker:
+    """
+    CircuitBreaker stops the EJ requests after failure_threshold consecutive failures
+    (server errors, connection errors or calls slower than slow_call_duration seconds).
+    While it is open, requests fail immediately with EJCircuitOpenError, so actions go
+    straight to the EJClientErrorManager path instead of waiting on EJ timeouts.
+
+    After reset_timeout seconds, a single probe request is let through (half-open). If it
+    succeeds the circuit is closed again, otherwise it stays open for another
+    reset_timeout.
+
+    https://martinfowler.com/bliki/CircuitBreaker.html
+    """
+
+    failure_threshold: int = EJ_CIRCUIT_FAILURE_THRESHOLD
+    reset_timeout: float = EJ_CIRCUIT_RESET_TIMEOUT
+    slow_call_duration: float = EJ_CIRCUIT_SLOW_CALL_DURATION
+    state: str = CLOSED
+    failures: int = 0
+    opened_at: float = 0
+    probing: bool = field(default=False, repr=False)
+
+    def before_request(self) -> bool:
+        """
+        Raises EJCircuitOpenError if the request must not be sent to EJ. Returns True if
+        the request is the half-open probe.
+        """
+        if self.state == CLOSED:
+            return False
+        if self.state == OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                raise EJCircuitOpenError
+            self.state = HALF_OPEN
+        if self.probing:
+            raise EJCircuitOpenError
+        self.probing = True
+        return True
+
+    def record(self, succeeded: bool, duration: float, probe: bool = False):
+        """
+        Records the outcome of a request sent to EJ. While the circuit is not closed,
+        only the probe outcome changes its state: requests that were already in flight
+        when it opened are ignored.
+        """
+        if self.state != CLOSED and not probe:
+            return
+        self.probing = False
+        if succeeded and duration < self.slow_call_duration:
+            self.state = CLOSED
+            self.failures = 0
+            return
+        self.failures += 1
+        if probe or self.failures >= self.failure_threshold:
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+
+
+CIRCUIT_BREAKER = CircuitBreaker()
@@ -2,16 +2,20 @@ import json
 import logging
 from typing import Text
 
-import requests
-
 from rasa_sdk import Tracker
 
-from .routes import auth_headers, comments_route
+from .cache import COMMENT_CACHE
+from .ej_client import EjClient
+from .routes import comment_route, comments_route
 from .settings import *
+from .statistics import invalidate_participation_counters
 from rasa_sdk.events import SlotSet
 
 logger = logging.getLogger(__name__)
 
+# Status of the comments that can be voted.
+APPROVED = "approved"
+
 
 class CommentDialogue:
     REFUSES_TO_ADD_COMMENT = "não"
@@ -75,8 +79,10 @@ class Comment:
         self.conversation_id = conversation_id
         self.content = comment_content
         self.token = tracker.get_slot("access_token")
+        self.sender_id = tracker.sender_id
+        self.ej_client = EjClient(tracker)
 
-    def create(self):
+    async def create(self):
         if len(self.content) > 3:
             body = json.dumps(
                 {
@@ -86,12 +92,55 @@ class Comment:
                 }
             )
             try:
-                response = requests.post(
-                    comments_route(),
-                    data=body,
-                    headers=auth_headers(self.token),
-                )
+                response = await self.ej_client.request(comments_route(), body)
+                invalidate_participation_counters(self.sender_id, self.conversation_id)
                 response = response.json()
             except Exception as e:
                 raise EJCommunicationError
             return response
+
+    @staticmethod
+    async def get(comment_id, ej_client: EjClient):
+        """
+        Returns the comment from COMMENT_CACHE, requesting it to EJ if it isn't cached.
+        Returns None if the comment is no longer approved.
+        """
+        comment = COMMENT_CACHE.get(str(comment_id))
+        if comment:
+            return dict(comment)
+        try:
+            response = await ej_client.request(comment_route(comment_id))
+            if response.status_code != 200:
+                return None
+            comment = Comment.set_id(response.json())
+        except Exception:
+            raise EJCommunicationError
+        if not Comment.cache(comment):
+            return None
+        return comment
+
+    @staticmethod
+    def cache(comment) -> bool:
+        """
+        Stores (or updates) the comment in COMMENT_CACHE. Comments that are not approved
+        (e.g., rejected by the moderation) are removed from it instead, and False is
+        returned.
+        """
+        if comment.get("status", APPROVED) != APPROVED or not comment.get("content"):
+            Comment.invalidate(comment["id"])
+            return False
+        COMMENT_CACHE.set(str(comment["id"]), dict(comment))
+        return True
+
+    @staticmethod
+    def invalidate(comment_id):
+        """
+        Removes the comment from COMMENT_CACHE, e.g., when it is edited or rejected.
+        """
+        COMMENT_CACHE.invalidate(str(comment_id))
+
+    @staticmethod
+    def set_id(comment):
+        comment_url_as_list = comment["links"]["self"].split("/")
+        comment["id"] = comment_url_as_list[len(comment_url_as_list) - 2]
+        return comment
@@ -0,0 +1,69 @@
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Deque, List, Set
+
+from .cache import TTLCache
+from .settings import (
+    EJ_COMMENT_QUEUE_CACHE_SIZE,
+    EJ_COMMENT_QUEUE_CACHE_TTL,
+    EJ_COMMENT_QUEUE_SIZE,
+)
+
+
+@dataclass
+class CommentQueue:
+    """
+    Ids of the comments a participant has yet to vote on in a conversation, requested
+    in bulk to EJ and served one per turn (their content is kept in COMMENT_CACHE,
+    shared by every participant). Comments voted by the participant are dropped, even
+    if EJ returns them again before the vote is registered.
+    """
+
+    comment_ids: Deque[str] = field(default_factory=deque)
+    voted: Set[str] = field(default_factory=set)
+
+    def __len__(self):
+        return len(self.comment_ids)
+
+    def pop(self) -> str:
+        """
+        Returns the id of the next comment not voted by the participant, or None.
+        """
+        while self.comment_ids:
+            comment_id = self.comment_ids.popleft()
+            if comment_id not in self.voted:
+                return comment_id
+        return None
+
+    def extend(self, comment_ids: List[str]):
+        queued = set(self.comment_ids)
+        for comment_id in comment_ids:
+            if len(self.comment_ids) >= EJ_COMMENT_QUEUE_SIZE:
+                break
+            if comment_id not in self.voted and comment_id not in queued:
+                self.comment_ids.append(comment_id)
+                queued.add(comment_id)
+
+    def retain(self, comment_ids: List[str]) -> List[str]:
+        """
+        Drops the queued ids that are not in comment_ids, and returns them.
+        """
+        kept = set(comment_ids)
+        dropped = [
+            comment_id for comment_id in self.comment_ids if comment_id not in kept
+        ]
+        self.comment_ids = deque(
+            comment_id for comment_id in self.comment_ids if comment_id in kept
+        )
+        return dropped
+
+    def mark_voted(self, comment_id):
+        self.voted.add(str(comment_id))
+
+
+# Comment queues, by sender_id and conversation id.
+COMMENT_QUEUES = TTLCache(
+    "comment_queue",
+    maxsize=EJ_COMMENT_QUEUE_CACHE_SIZE,
+    ttl=EJ_COMMENT_QUEUE_CACHE_TTL,
+)
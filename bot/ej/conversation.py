@@ -1,20 +1,30 @@
+import asyncio
 from dataclasses import dataclass
 import logging
+import random
 
 from actions.logger import custom_logger
 from ej.ej_client import EjClient
 from rasa_sdk import Tracker
 
+from .cache import METADATA_CACHE
+from .comment import Comment
+from .comment_queue import COMMENT_QUEUES, CommentQueue
+from .retry import action_deadline
 from .routes import (
     random_comment_route,
     conversation_route,
+    user_pending_comments_route,
     user_statistics_route,
 )
-from .settings import EJCommunicationError
-
+from .settings import EJ_COMMENT_QUEUE_REFILL_AT, EJCommunicationError
+from .statistics import get_participation_counters, set_participation_counters
 
 logger = logging.getLogger(__name__)
 
+# Background refills of comment queues, by sender_id and conversation id.
+_comment_queue_refills = {}
+
 
 @dataclass
 class Conversation:
@@ -68,10 +78,12 @@ class Conversation:
         return self.tracker.get_slot("participant_can_add_comments")
 
     @staticmethod
-    def get(conversation_id: int, tracker: Tracker):
+    async def get(conversation_id: int, tracker: Tracker):
         ej_client = EjClient(tracker)
         try:
-            response = ej_client.request(conversation_route(conversation_id))
+            response = await ej_client.request(
+                conversation_route(conversation_id), cache=METADATA_CACHE
+            )
             conversation = response.json()
             if len(conversation) == 0:
                 raise EJCommunicationError
@@ -81,39 +93,154 @@ class Conversation:
         except:
             raise EJCommunicationError
 
-    def get_participant_statistics(self):
+    async def get_participant_statistics(self):
+        """
+        Returns the participant statistics. They are requested once and kept as
+        ParticipationCounters, updated locally with the participant votes and
+        reconciled with EJ periodically.
+        """
+        counters = get_participation_counters(self.tracker.sender_id, self.id)
+        if counters:
+            return dict(counters.statistics)
         try:
             url = user_statistics_route(self.id)
-            response = self.ej_client.request(url)
-            response = response.json()
+            response = await self.ej_client.request(url)
+            statistics = response.json()
         except:
             raise EJCommunicationError
-        return response
+        if response.status_code == 200:
+            set_participation_counters(self.tracker.sender_id, self.id, statistics)
+        return statistics
 
-    # TODO: refactor the try/except part to be a Python decorator.
-    def get_next_comment(self):
-        import time
+    async def get_next_comment(self):
+        """
+        Returns the next comment for the participant to vote on. Comments are served
+        from the participant CommentQueue, filled in bulk with the participant pending
+        comments, and their content from COMMENT_CACHE. If the queue can't be filled, a
+        random comment is requested.
+        """
+        queue = self._get_comment_queue()
+        comment = await self._pop_comment(queue)
+        if comment is None:
+            if not await self._fill_comment_queue(queue):
+                return await self._request_next_comment()
+            comment = await self._pop_comment(queue)
+        if comment and len(queue) < EJ_COMMENT_QUEUE_REFILL_AT:
+            self._refill_comment_queue_in_background(queue)
+        return comment
 
-        def _request():
-            response = self.ej_client.request(url)
-            if response.status_code == 500:
-                raise EJCommunicationError
-            comment = response.json()
-            if comment.get("content"):
-                comment_url_as_list = comment["links"]["self"].split("/")
-                comment["id"] = comment_url_as_list[len(comment_url_as_list) - 2]
+    async def _pop_comment(self, queue: CommentQueue):
+        """
+        Returns the next comment of queue. Comments are served from COMMENT_CACHE as
+        they were when the queue was last filled: comments rejected or edited on EJ are
+        dropped from the queue or updated by the next refill (see _fill_comment_queue). Comments that
+        are not cached are requested to EJ, and skipped if no longer approved.
+        """
+        comment_id = queue.pop()
+        while comment_id is not None:
+            comment = await Comment.get(comment_id, self.ej_client)
+            if comment:
                 return comment
-            return None
+            comment_id = queue.pop()
+        return None
 
-        url = random_comment_route(self.id)
+    async def prefetch_next_comment(self, voted_comment_id=None):
+        """
+        Drops the voted comment from the participant CommentQueue, and refills the
+        queue if it is running low. It runs while the participant vote is sent, so the
+        next get_next_comment call doesn't need to request comments to EJ.
+        """
+        queue = self._get_comment_queue()
+        if voted_comment_id:
+            queue.mark_voted(voted_comment_id)
+        if len(queue) < EJ_COMMENT_QUEUE_REFILL_AT:
+            await self._fill_comment_queue(queue)
+
+    def _get_comment_queue(self) -> CommentQueue:
+        key = (self.tracker.sender_id, str(self.id))
+        queue = COMMENT_QUEUES.get(key)
+        if queue is None:
+            queue = CommentQueue()
+            COMMENT_QUEUES.set(key, queue)
+        return queue
+
+    async def _fill_comment_queue(self, queue: CommentQueue) -> bool:
+        """
+        Adds the participant pending comments to queue, in random order. Returns False
+        if they could not be requested.
+
+        Queued comments missing from the pending comments (e.g., rejected or removed on
+        EJ, or voted by the participant on another channel) are dropped from queue.
+        They are kept in COMMENT_CACHE, since they may still be pending for the other
+        participants: only the comment status and content invalidate it (see
+        Comment.cache).
+        """
         try:
-            return _request()
-        except EJCommunicationError:
-            time.sleep(2)
+            response = await self.ej_client.request(
+                user_pending_comments_route(self.id)
+            )
+            if response.status_code != 200:
+                return False
+            comments = response.json()
+        except Exception as error:
+            custom_logger("could not request the pending comments", data=str(error))
+            return False
+        if isinstance(comments, dict):
+            comments = comments.get("results")
+        if not isinstance(comments, list):
+            return False
+        # EJ returns the comments content along with the pending comments, so it is
+        # stored (or updated, if the comment was edited) in COMMENT_CACHE.
+        comment_ids = [
+            comment["id"]
+            for comment in map(Comment.set_id, comments)
+            if Comment.cache(comment)
+        ]
+        queue.retain(comment_ids)
+        random.shuffle(comment_ids)
+        queue.extend(comment_ids)
+        return True
+
+    def _refill_comment_queue_in_background(self, queue: CommentQueue):
+        """
+        Refills queue without blocking the running action. The refill has its own
+        deadline, and doesn't refresh the participant tokens, since the action may
+        have returned its slots before the refill finishes.
+        """
+        key = (self.tracker.sender_id, str(self.id))
+        if key in _comment_queue_refills:
+            return
+        conversation = Conversation(self.tracker)
+        conversation.ej_client = EjClient(
+            None, access_token=self.ej_client.get_tokens()[0]
+        )
+
+        async def refill():
+            with action_deadline(detached=True):
+                await conversation._fill_comment_queue(queue)
+
+        task = asyncio.ensure_future(refill())
+        _comment_queue_refills[key] = task
+        task.add_done_callback(lambda _: _comment_queue_refills.pop(key, None))
+
+    async def _request_next_comment(self):
+        """
+        Requests a random comment for the participant to vote on. Failed requests are
+        retried by EjClient following its retry policy.
+        """
+        url = random_comment_route(self.id)
         try:
-            return _request()
+            response = await self.ej_client.request(url)
+            if response.status_code == 500:
+                raise EJCommunicationError
+            comment = response.json()
         except Exception:
             raise EJCommunicationError
+        if comment.get("content"):
+            comment = Comment.set_id(comment)
+            Comment.cache(comment)
+            return comment
+        return None
 
     @staticmethod
     def user_should_authenticate(
@@ -125,6 +252,16 @@ class Conversation:
                 return True
         return False
 
+    @staticmethod
+    def user_can_be_asked_to_authenticate(
+        has_completed_registration: bool, anonymous_votes_limit: int
+    ):
+        """
+        Returns True if the participant may reach the anonymous votes limit, and be
+        asked to authenticate (see user_should_authenticate).
+        """
+        return not has_completed_registration and anonymous_votes_limit is not None
+
     @staticmethod
     def available_comments_to_vote(statistics):
         return statistics["missing_votes"] >= 1
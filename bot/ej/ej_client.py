@@ -1,11 +1,193 @@
+import asyncio
+import atexit
 from dataclasses import dataclass
-from typing import Any, Dict
+import functools
+import json
+import time
+from typing import Any, Awaitable, Callable, Dict, Tuple
 
-import requests
+import aiohttp
+import jwt
 
 from rasa_sdk import Tracker
 
-from .routes import HEADERS, auth_headers, refresh_token_route
+from .circuit_breaker import CIRCUIT_BREAKER
+from .retry import RETRY_POLICY, Deadline
+from .routes import (
+    HEADERS,
+    auth_headers,
+    auth_route,
+    refresh_token_route,
+    registration_route,
+)
+from .settings import (
+    EJ_HTTP_CONNECT_TIMEOUT,
+    EJ_HTTP_FAST_READ_TIMEOUT,
+    EJ_HTTP_READ_TIMEOUT,
+    EJ_HTTP_SLOW_READ_TIMEOUT,
+    EJ_HTTP_DNS_CACHE_TTL,
+    EJ_HTTP_KEEPALIVE,
+    EJ_HTTP_KEEPALIVE_TIMEOUT,
+    EJ_HTTP_POOL_SIZE,
+    EJ_TOKEN_REFRESH_MARGIN,
+    EJCommunicationError,
+    EJDeadlineExceededError,
+)
+
+_session: aiohttp.ClientSession = None
+_session_loop: asyncio.AbstractEventLoop = None
+
+# Token refreshes in flight, by refresh token.
+_pending_refreshes: Dict[str, asyncio.Future] = {}
+# Cacheable GET requests in flight, by url.
+_pending_gets: Dict[str, asyncio.Future] = {}
+
+IDEMPOTENT_METHODS = ("GET", "PUT")
+RETRY_STATUS = (500, 502, 503, 504)
+
+# Routes requested on every vote, which use EJ_HTTP_FAST_READ_TIMEOUT.
+FAST_ROUTES = ("/random-comment/", "/user-statistics/")
+
+
+def get_session() -> aiohttp.ClientSession:
+    """
+    Returns the process-wide session used for every request sent to the EJ API.
+    Connections are pooled and kept alive, and the EJ host resolution is cached, so
+    consecutive actions reuse the same TCP (and TLS) connection instead of opening a
+    new one per request.
+
+    aiohttp sessions are bound to the event loop that created them, so a new session is
+    created if the running loop changes (e.g., the action server restarts its loop), and
+    the previous one is discarded.
+    """
+    global _session, _session_loop
+    loop = asyncio.get_running_loop()
+    if _session is not None and not _session.closed and _session_loop is not loop:
+        _discard_session(_session, _session_loop)
+    if _session is None or _session.closed or _session_loop is not loop:
+        keepalive = (
+            {"keepalive_timeout": EJ_HTTP_KEEPALIVE_TIMEOUT}
+            if EJ_HTTP_KEEPALIVE
+            else {"force_close": True}
+        )
+        connector = aiohttp.TCPConnector(
+            limit=EJ_HTTP_POOL_SIZE,
+            use_dns_cache=True,
+            ttl_dns_cache=EJ_HTTP_DNS_CACHE_TTL,
+            **keepalive,
+        )
+        _session = aiohttp.ClientSession(connector=connector)
+        _session_loop = loop
+    return _session
+
+
+def _discard_session(session: aiohttp.ClientSession, loop: asyncio.AbstractEventLoop):
+    """
+    Closes a session bound to an event loop other than the running one, whose close()
+    can't be awaited here.
+    """
+    if loop.is_running():
+        # the loop runs in another thread.
+        asyncio.run_coroutine_threadsafe(session.close(), loop)
+        return
+    connector = session.connector
+    # the session no longer owns the connector, so it isn't reported as unclosed.
+    session.detach()
+    if connector is not None:
+        try:
+            # closes the pooled connections synchronously, since the loop isn't running
+            # (aiohttp is pinned in docker/actions-requirements.txt).
+            connector._close()
+        except RuntimeError:
+            # the loop is closed, and so are the connections transports.
+            pass
+
+
+async def close_session():
+    """
+    Closes the process-wide session and its pooled connections.
+    """
+    global _session, _session_loop
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+    _session_loop = None
+
+
+@atexit.register
+def _close_session_on_exit():
+    """
+    Closes the process-wide session when the action server exits.
+    """
+    global _session, _session_loop
+    if _session is not None and not _session.closed:
+        _discard_session(_session, _session_loop)
+    _session = None
+    _session_loop = None
+
+
+async def single_flight(
+    pending: Dict[str, asyncio.Future], key: str, coroutine: Callable[[], Awaitable]
+):
+    """
+    Awaits coroutine() unless a call with the same key is already in flight, in which
+    case its result is awaited instead. The shared call is shielded, so a cancelled
+    caller doesn't cancel it for the others.
+    """
+    future = pending.get(key)
+    if future is None:
+        future = asyncio.ensure_future(coroutine())
+        pending[key] = future
+        future.add_done_callback(lambda _: pending.pop(key, None))
+    return await asyncio.shield(future)
+
+
+@functools.lru_cache(maxsize=1024)
+def get_token_expiration(token: str) -> float:
+    """
+    Returns the expiration (`exp` claim, as a UNIX timestamp) of an EJ access token, or
+    None if it is not a JWT with an expiration. The signature isn't verified: the token is
+    only inspected to decide when to refresh it, EJ still validates it on every request.
+    """
+    try:
+        return jwt.decode(token, options={"verify_signature": False}).get("exp")
+    except jwt.PyJWTError:
+        return None
+
+
+def get_route_timeout(url: str, deadline: Deadline = None) -> aiohttp.ClientTimeout:
+    """
+    Returns the connect and read timeouts of a request sent to url. The total timeout
+    is the time left in the deadline of the running action, if any.
+    """
+    read_timeout = EJ_HTTP_READ_TIMEOUT
+    if url.endswith(FAST_ROUTES):
+        read_timeout = EJ_HTTP_FAST_READ_TIMEOUT
+    elif url in (registration_route(), auth_route()):
+        read_timeout = EJ_HTTP_SLOW_READ_TIMEOUT
+    return aiohttp.ClientTimeout(
+        total=deadline.remaining() if deadline else None,
+        sock_connect=EJ_HTTP_CONNECT_TIMEOUT,
+        sock_read=read_timeout,
+    )
+
+
+@dataclass
+class EjResponse:
+    """
+    Status and body of an EJ API response. The body is read before the pooled
+    connection is released, so it can be used after the request has finished.
+    """
+
+    status_code: int
+    content: bytes = b""
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code < 400
+
+    def json(self) -> Any:
+        return json.loads(self.content)
 
 
 @dataclass
@@ -24,68 +206,175 @@ class EjClient:
             self.access_token = self.tracker.get_slot("access_token")
             self.refresh_token = self.tracker.get_slot("refresh_token")
 
+    def get_tokens(self) -> Tuple[str, str]:
+        """
+        Returns the access and refresh tokens. The tracker slots are preferred, since they
+        may be updated (e.g., by User.authenticate) after the client was created.
+        """
+        if self.tracker:
+            return (
+                self.tracker.get_slot("access_token"),
+                self.tracker.get_slot("refresh_token"),
+            )
+        return self.access_token, self.refresh_token
+
     def get_headers(self):
         """
-        Returns the headers for the HTTP request. If tracker access_token is available, includes
+        Returns the headers for the HTTP request. If an access_token is available, includes
         it with an authorization header.
         """
-        if self.tracker:
-            access_token = self.tracker.get_slot("access_token")
-            if access_token:
-                return auth_headers(access_token)
+        access_token, _ = self.get_tokens()
+        if access_token:
+            return auth_headers(access_token)
         return HEADERS
 
-    def _refresh_access_token(self):
+    async def _refresh_expiring_access_token(self):
+        """
+        Refreshes the access token before sending a request if it expires in less than
+        EJ_TOKEN_REFRESH_MARGIN seconds, instead of waiting for EJ to answer 401.
+        """
+        access_token, refresh_token = self.get_tokens()
+        if not access_token or not refresh_token:
+            return
+        expiration = get_token_expiration(access_token)
+        if expiration and expiration - time.time() < EJ_TOKEN_REFRESH_MARGIN:
+            await self._refresh_access_token()
+
+    async def _refresh_access_token(self):
         """
-        Requests a new access_token using the refresh_token attribute.
+        Requests a new access_token using the refresh_token attribute. The new tokens
+        are written to the tracker slots, so the running action can return them to Rasa.
+
+        Concurrent refreshes of the same refresh_token (e.g., actions of the same
+        participant running at the same time) are coalesced by single_flight: only one
+        request is sent to EJ, and every caller waits for its result.
         """
-        response = requests.post(refresh_token_route(), {"refresh": self.refresh_token})
-        if response.status_code == 200:
-            data = response.json()
-            self.access_token = data.get("access")
+        _, refresh_token = self.get_tokens()
+        if not refresh_token:
+            raise EJCommunicationError("there is no refresh token to use.")
+        self.access_token, self.refresh_token = await single_flight(
+            _pending_refreshes,
+            refresh_token,
+            lambda: self._request_new_tokens(refresh_token),
+        )
+        if self.tracker:
             self.tracker.slots["access_token"] = self.access_token
-        else:
-            raise Exception("could not refresh access token on EJ API.")
+            self.tracker.slots["refresh_token"] = self.refresh_token
 
-    def _post(self, url: str, headers: Dict, payload=None):
-        return requests.post(
-            url,
-            payload,
-            headers=headers,
+    async def _request_new_tokens(self, refresh_token: str) -> Tuple[str, str]:
+        response = await self._send(
+            "POST",
+            refresh_token_route(),
+            payload={"refresh": refresh_token},
+            retry_safe=True,
         )
+        if response.status_code != 200:
+            raise EJCommunicationError("could not refresh access token on EJ API.")
+        data = response.json()
+        # EJ may rotate the refresh token as well.
+        return data.get("access"), data.get("refresh", refresh_token)
+
+    async def _fetch(
+        self, method: str, url: str, headers: Dict, payload, deadline: Deadline
+    ) -> EjResponse:
+        """
+        Sends a single HTTP request through the pooled session.
+        """
+        timeout = get_route_timeout(url, deadline)
+        async with get_session().request(
+            method, url, data=payload, headers=headers, timeout=timeout
+        ) as response:
+            return EjResponse(response.status, await response.read())
 
-    def _put(self, url: str, headers: Dict, payload=None):
-        return requests.put(
-            url,
-            payload,
-            headers=headers,
+    async def _send(
+        self,
+        method: str,
+        url: str,
+        headers: Dict = None,
+        payload=None,
+        retry_safe: bool = False,
+    ) -> EjResponse:
+        """
+        Sends the HTTP request following RETRY_POLICY. Only idempotent requests, or the
+        ones explicitly marked as retry_safe, are retried, and never beyond the
+        deadline of the running action. Every attempt goes through CIRCUIT_BREAKER,
+        which raises EJCircuitOpenError while EJ is considered unavailable.
+        """
+        deadline = Deadline.current()
+        retries = (
+            RETRY_POLICY.retries if retry_safe or method in IDEMPOTENT_METHODS else 0
         )
+        for attempt in range(retries + 1):
+            if deadline and deadline.expired():
+                raise EJDeadlineExceededError
+            probe = CIRCUIT_BREAKER.before_request()
+            started_at = time.monotonic()
+            succeeded = False
+            try:
+                response = await self._fetch(method, url, headers, payload, deadline)
+                succeeded = response.status_code not in RETRY_STATUS
+                if succeeded or attempt == retries:
+                    return response
+            except (aiohttp.ClientError, asyncio.TimeoutError) as error:
+                if attempt == retries:
+                    raise EJCommunicationError from error
+            finally:
+                CIRCUIT_BREAKER.record(succeeded, time.monotonic() - started_at, probe)
+            await RETRY_POLICY.wait(attempt, deadline)
+
+    async def _post(self, url: str, headers: Dict, payload=None, retry_safe=False):
+        return await self._send("POST", url, headers, payload, retry_safe)
 
-    def _get(self, url: str, headers: Dict):
-        return requests.get(url, headers=headers)
+    async def _put(self, url: str, headers: Dict, payload=None):
+        return await self._send("PUT", url, headers, payload)
 
-    def request(self, url: str, payload=None, put=False):
+    async def _get(self, url: str, headers: Dict):
+        return await self._send("GET", url, headers)
+
+    async def request(
+        self, url: str, payload=None, put=False, retry_safe=False, cache=None
+    ) -> EjResponse:
         """
-        Send a HTTP request to the EJ API endpoints.
+        Send a HTTP request to the EJ API endpoints. POST requests are only retried
+        if retry_safe is True, i.e., sending them twice has no additional effect.
+
+        Successful GET responses are stored in cache (a TTLCache), if given, and reused
+        for the same url. Concurrent cache misses for the same url are coalesced into a
+        single request to EJ.
         """
+        if cache is None or payload:
+            return await self._request(url, payload, put, retry_safe)
+        response = cache.get(url)
+        if response is None:
+            response = await single_flight(
+                _pending_gets, url, lambda: self._request(url)
+            )
+            if response.ok:
+                cache.set(url, response)
+        return response
+
+    async def _request(
+        self, url: str, payload=None, put=False, retry_safe=False
+    ) -> EjResponse:
         response: Any
+        await self._refresh_expiring_access_token()
         headers = self.get_headers()
         if payload and not put:
-            response = self._post(url, headers, payload)
+            response = await self._post(url, headers, payload, retry_safe)
             if response.status_code == 401:
-                self._refresh_access_token()
+                await self._refresh_access_token()
                 headers = self.get_headers()
-                response = self._post(url, headers, payload)
+                response = await self._post(url, headers, payload, retry_safe)
         elif payload and put:
-            response = self._put(url, headers, payload)
+            response = await self._put(url, headers, payload)
             if response.status_code == 401:
-                self._refresh_access_token()
+                await self._refresh_access_token()
                 headers = self.get_headers()
-                response = self._put(url, headers, payload)
+                response = await self._put(url, headers, payload)
         else:
-            response = self._get(url, headers)
+            response = await self._get(url, headers)
             if response.status_code == 401:
-                self._refresh_access_token()
+                await self._refresh_access_token()
                 headers = self.get_headers()
-                response = self._get(url, headers)
+                response = await self._get(url, headers)
         return response
@@ -0,0 +1,75 @@
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, Tuple
+
+MetricKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+def metric_key(name: str, labels: Dict[str, str]) -> MetricKey:
+    return name, tuple(sorted(labels.items()))
+
+
+@dataclass
+class Metrics:
+    """
+    In-process counters, gauges and duration summaries of the EJ integration (e.g., how
+    many times an action exceeded its time budget). Metrics are identified by a name and
+    optional labels:
+
+        METRICS.increment("ej_action_budget_exceeded", action="action_ask_vote")
+        METRICS.get("ej_action_budget_exceeded", action="action_ask_vote")
+    """
+
+    counters: Counter = field(default_factory=Counter)
+    gauges: Dict[MetricKey, float] = field(default_factory=dict)
+    durations: Dict[MetricKey, Dict[str, float]] = field(default_factory=dict)
+
+    def increment(self, name: str, amount: int = 1, **labels):
+        self.counters[metric_key(name, labels)] += amount
+
+    def set_gauge(self, name: str, value: float, **labels):
+        self.gauges[metric_key(name, labels)] = value
+
+    def observe(self, name: str, seconds: float, **labels):
+        summary = self.durations.setdefault(
+            metric_key(name, labels), {"count": 0, "sum": 0.0, "max": 0.0}
+        )
+        summary["count"] += 1
+        summary["sum"] += seconds
+        summary["max"] = max(summary["max"], seconds)
+
+    def get(self, name: str, **labels) -> float:
+        key = metric_key(name, labels)
+        if key in self.gauges:
+            return self.gauges[key]
+        return self.counters[key]
+
+    def snapshot(self) -> Dict:
+        """
+        Returns every metric as a JSON serializable dict, with labels formatted as
+        name{label=value}.
+        """
+
+        def format_key(key: MetricKey) -> str:
+            name, labels = key
+            if not labels:
+                return name
+            return f"{name}{{{','.join(f'{k}={v}' for k, v in labels)}}}"
+
+        return {
+            "counters": {
+                format_key(key): value for key, value in self.counters.items()
+            },
+            "gauges": {format_key(key): value for key, value in self.gauges.items()},
+            "durations": {
+                format_key(key): dict(value) for key, value in self.durations.items()
+            },
+        }
+
+    def reset(self):
+        self.counters.clear()
+        self.gauges.clear()
+        self.durations.clear()
+
+
+METRICS = Metrics()
@@ -0,0 +1,157 @@
+"""
+Registers in EJ, before a campaign starts, the participants of a contact list, so their
+first message doesn't wait for the registration. The contact list is a CSV file with
+the `phone` (the WhatsApp sender_id, e.g. 5561999999999) and `name` columns:
+
+    cd bot && python -m ej.preregister_participants contacts.csv --concurrency 10 --rate 20
+
+The participants tokens are stored in a SQLite database (EJ_PREREGISTRATION_PATH),
+read by User.authenticate on their first message. Participants already stored are
+skipped, so an interrupted run can be started again.
+"""
+
+import argparse
+import asyncio
+import csv
+import time
+from typing import Dict, List
+
+from rasa_sdk import Tracker
+
+from actions.logger import custom_logger
+
+from .ej_client import close_session
+from .metrics import METRICS
+from .preregistration import PreregistrationStore
+from .retry import action_deadline
+from .settings import (
+    EJ_PREREGISTRATION_CONCURRENCY,
+    EJ_PREREGISTRATION_PATH,
+    EJ_PREREGISTRATION_RATE,
+)
+from .user import User
+
+
+class RateLimiter:
+    """
+    Spaces the calls to wait() so at most `rate` of them return per second.
+    """
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate if rate > 0 else 0
+        self._next_call = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next_call - now
+            self._next_call = max(now, self._next_call) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+def read_contacts(path: str) -> List[Dict]:
+    with open(path, newline="") as contacts_file:
+        return [
+            {"phone": row["phone"].strip(), "name": (row.get("name") or "").strip()}
+            for row in csv.DictReader(contacts_file)
+            if row.get("phone", "").strip()
+        ]
+
+
+def contact_tracker(contact: Dict) -> Tracker:
+    """
+    Returns a tracker like the one of the contact first message, so the registration
+    data is the same built by User.authenticate.
+    """
+    slots = {"access_token": None, "refresh_token": None}
+    metadata = {"contact_name": contact["name"]} if contact["name"] else {}
+    latest_message = {"metadata": metadata}
+    return Tracker(
+        contact["phone"], slots, latest_message, [], False, None, {}, "action_listen"
+    )
+
+
+async def preregister(
+    contacts: List[Dict],
+    store: PreregistrationStore,
+    concurrency: int = EJ_PREREGISTRATION_CONCURRENCY,
+    rate: float = EJ_PREREGISTRATION_RATE,
+):
+    """
+    Registers the contacts not in store yet, sending at most `concurrency` requests at
+    a time and starting at most `rate` registrations per second.
+    """
+    registered = store.sender_ids()
+    pending = [contact for contact in contacts if contact["phone"] not in registered]
+    METRICS.increment("ej_preregistration_skipped", len(contacts) - len(pending))
+    semaphore = asyncio.Semaphore(concurrency)
+    rate_limiter = RateLimiter(rate)
+
+    async def register(contact: Dict):
+        async with semaphore:
+            await rate_limiter.wait()
+            tracker = contact_tracker(contact)
+            try:
+                with action_deadline(detached=True):
+                    await User(tracker).authenticate()
+            except Exception as error:
+                METRICS.increment("ej_preregistration_failed")
+                custom_logger(
+                    "could not register the participant",
+                    data=str(error),
+                    sender_id=contact["phone"],
+                )
+                return
+            store.add(contact["phone"], tracker.slots)
+            METRICS.increment("ej_preregistration_registered")
+
+    await asyncio.gather(*[register(contact) for contact in pending])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Registers the participants of a contact list in EJ."
+    )
+    parser.add_argument("contacts", help="CSV file with the phone and name columns")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=EJ_PREREGISTRATION_CONCURRENCY,
+        help="maximum number of requests sent at a time",
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=EJ_PREREGISTRATION_RATE,
+        help="maximum number of registrations started per second",
+    )
+    parser.add_argument(
+        "--store",
+        default=EJ_PREREGISTRATION_PATH,
+        help="SQLite database where the participants tokens are stored",
+    )
+    args = parser.parse_args()
+
+    async def run():
+        try:
+            await preregister(
+                read_contacts(args.contacts),
+                PreregistrationStore(args.store),
+                args.concurrency,
+                args.rate,
+            )
+        finally:
+            await close_session()
+
+    asyncio.run(run())
+    print(
+        f"registered: {METRICS.get('ej_preregistration_registered')}, "
+        f"failed: {METRICS.get('ej_preregistration_failed')}, "
+        f"skipped: {METRICS.get('ej_preregistration_skipped')}"
+    )
+
+
+if __name__ == "__main__":
+    main()
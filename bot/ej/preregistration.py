@@ -0,0 +1,97 @@
+import os
+import sqlite3
+import time
+from typing import Dict
+
+from .ej_client import get_token_expiration
+from .metrics import METRICS
+from .settings import EJ_PREREGISTRATION_PATH
+
+
+class PreregistrationStore:
+    """
+    PreregistrationStore keeps the tokens of the participants registered before their
+    first message (see preregister_participants). The tokens of a participant are read
+    only once: from then on, they are kept in the tracker slots.
+
+    The tokens are stored in plain text, so the database file is only readable by its
+    owner, and it should be removed once the campaign ends.
+    """
+
+    def __init__(self, path: str = EJ_PREREGISTRATION_PATH):
+        self.path = path
+        self._connection: sqlite3.Connection = None
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.path, isolation_level=None)
+            os.chmod(self.path, 0o600)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS participants (
+                    sender_id TEXT PRIMARY KEY,
+                    access_token TEXT NOT NULL,
+                    refresh_token TEXT NOT NULL,
+                    has_completed_registration INTEGER NOT NULL,
+                    registered_at REAL NOT NULL,
+                    taken INTEGER NOT NULL DEFAULT 0
+                )
+                """
+            )
+        return self._connection
+
+    def add(self, sender_id: str, tokens: Dict):
+        self.connection.execute(
+            """
+            INSERT OR REPLACE INTO participants (
+                sender_id, access_token, refresh_token, has_completed_registration,
+                registered_at
+            ) VALUES (?, ?, ?, ?, ?)
+            """,
+            (
+                str(sender_id),
+                tokens["access_token"],
+                tokens["refresh_token"],
+                bool(tokens["has_completed_registration"]),
+                time.time(),
+            ),
+        )
+
+    def sender_ids(self) -> set:
+        rows = self.connection.execute("SELECT sender_id FROM participants")
+        return {row[0] for row in rows}
+
+    def take(self, sender_id: str) -> Dict:
+        """
+        Returns the tokens of a preregistered participant, or None if they were not
+        stored, were already taken or the refresh token has expired. In that case, the
+        participant is authenticated as any other.
+        """
+        if self._connection is None and not os.path.exists(self.path):
+            return None
+        row = self.connection.execute(
+            """
+            SELECT access_token, refresh_token, has_completed_registration
+            FROM participants WHERE sender_id = ? AND NOT taken
+            """,
+            (str(sender_id),),
+        ).fetchone()
+        if row is None:
+            return None
+        self.connection.execute(
+            "UPDATE participants SET taken = 1 WHERE sender_id = ?", (str(sender_id),)
+        )
+        expiration = get_token_expiration(row[1])
+        if expiration is not None and expiration <= time.time():
+            METRICS.increment("ej_preregistration_expired")
+            return None
+        return {
+            "access_token": row[0],
+            "refresh_token": row[1],
+            "has_completed_registration": bool(row[2]),
+        }
+
+
+PREREGISTERED_PARTICIPANTS = PreregistrationStore()
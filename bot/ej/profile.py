@@ -1,29 +1,65 @@
+from dataclasses import dataclass
 from enum import IntEnum
 import json
 import os
 import random
+from types import MappingProxyType
+from typing import Dict, Mapping, Tuple
 
 from actions.logger import custom_logger
 from ej.routes import my_profile_route, profiles_route
 
+from .cache import PROFILE_CACHE
 from .conversation import Conversation
 from .ej_client import EjClient
 
+QUESTIONS_FILE = f"{os.path.dirname(os.path.realpath(__file__))}/profile-questions.json"
+
+PROFILE_FIELDS = (
+    "user",
+    "phone_number",
+    "ethnicity_choices",
+    "gender",
+    "age_range",
+    "region",
+)
+
+# Loaded question banks, by file path, with the file modification time.
+_question_banks: Dict[str, Tuple[int, "QuestionBank"]] = {}
+
 
 class Profile:
     def __init__(self, tracker):
         self.ej_client: EjClient = EjClient(tracker)
+        self.sender_id = tracker.sender_id if tracker else None
         self.questions: Question = []
-        self.get_profile()
+        self.remaining_questions: Question = []
         self.set_attributes()
-        self.remaining_questions: Question = self.set_remaining_questions()
 
-    def get_profile(self):
+    @classmethod
+    async def get(cls, tracker):
+        """
+        Returns the participant Profile populated with the EJ API profile data. The
+        profile is requested to EJ only if there is no snapshot of it in PROFILE_CACHE.
+        """
+        profile = cls(tracker)
+        snapshot = PROFILE_CACHE.get(profile.sender_id)
+        if snapshot:
+            profile.set_profile_data(snapshot)
+        else:
+            await profile.get_profile()
+        profile.remaining_questions = profile.set_remaining_questions()
+        return profile
+
+    async def get_profile(self):
         """
         get profile by ej-api
         """
-        response = self.ej_client.request(my_profile_route())
-        data = response.json()
+        response = await self.ej_client.request(my_profile_route())
+        self.set_profile_data(response.json())
+        PROFILE_CACHE.set(self.sender_id, self.get_profile_data())
+
+    def set_profile_data(self, data: dict):
         self.user = data["user"]
         self.phone_number = data["phone_number"]
         self.ethnicity_choices = data["ethnicity_choices"]
@@ -31,65 +67,31 @@ class Profile:
         self.age_range = data["age_range"]
         self.region = data["region"]
 
+    def get_profile_data(self) -> dict:
+        return {field: getattr(self, field) for field in PROFILE_FIELDS}
+
     def set_remaining_questions(self):
         """
         set remaining questions
         """
         remaining_questions = []
-        if self.age_range == AgeRange.NOT_FILLED:
-            remaining_questions.extend(
-                [q for q in self.questions if q.change == AgeRange]
-            )
-        if self.ethnicity_choices == Ethnicity.NOT_FILLED:
-            remaining_questions.extend(
-                [q for q in self.questions if q.change == Ethnicity]
-            )
-        if self.gender == Gender.NOT_FILLED:
-            remaining_questions.extend(
-                [q for q in self.questions if q.change == Gender]
-            )
-        if self.region == Region.NOT_FILLED:
-            remaining_questions.extend(
-                [q for q in self.questions if q.change == Region]
-            )
+        for change, value in (
+            (AgeRange, self.age_range),
+            (Ethnicity, self.ethnicity_choices),
+            (Gender, self.gender),
+            (Region, self.region),
+        ):
+            if value == change.NOT_FILLED:
+                remaining_questions.extend(self.question_bank.by_change.get(change, ()))
 
         # sort by id
         remaining_questions.sort(key=lambda x: x.id)
         return remaining_questions
 
     def set_attributes(self):
-        questions_file = (
-            f"{str(os.path.dirname(os.path.realpath(__file__)))}/profile-questions.json"
-        )
-        with open(questions_file) as f:
-            data = json.load(f)
-            self.questions = self.get_questions(data)
-            self.random_questions = data["random_questions"]
-
-    def get_questions(self, data):
-        """
-        get questions by profile-questions.json
-        """
-        questions: Question = []
-
-        for question in data["questions"]:
-            id = int(question["id"])
-            body = question["body"]
-            answers = question["answers"]
-            tmp_change = question["change"]
-            put_payload = question["put_payload"]
-
-            if tmp_change == "Ethnicity":
-                change = Ethnicity
-            elif tmp_change == "Region":
-                change = Region
-            elif tmp_change == "Gender":
-                change = Gender
-            elif tmp_change == "AgeRange":
-                change = AgeRange
-
-            questions.append(Question(id, body, answers, change, put_payload))
-        return questions
+        self.question_bank = QuestionBank.load()
+        self.questions = self.question_bank.questions
+        self.random_questions = self.question_bank.random_questions
 
     def get_next_question(self):
         """
@@ -120,75 +122,96 @@ class Profile:
         if len(self.remaining_questions) == 0:
             custom_logger("NO MORE QUESTIONS")
             return False, -1
+        return Profile.question_could_be_due(
+            conversation, conversation_statistics, tracker
+        )
 
+    @staticmethod
+    def question_could_be_due(
+        conversation: Conversation, conversation_statistics, tracker
+    ):
+        """
+        check if the participant votes reached the count to send a profile question.
+        It doesn't depend on the participant profile, so it can be checked before
+        requesting it.
+        """
         if not conversation.send_profile_question:
             custom_logger("conversation.send_profile_question: False")
             return False, -1
 
-        if conversation.send_profile_question:
-            current_votes = Conversation.get_voted_comments(conversation_statistics)
-            votes_to_send_profile_questions = (
-                conversation.votes_to_send_profile_questions
-            )
-            next_value_to_send_profile_questions = tracker.get_slot(
-                "next_count_to_send_profile_question"
+        current_votes = Conversation.get_voted_comments(conversation_statistics)
+        votes_to_send_profile_questions = conversation.votes_to_send_profile_questions
+        next_value_to_send_profile_questions = tracker.get_slot(
+            "next_count_to_send_profile_question"
+        )
+
+        if not next_value_to_send_profile_questions:
+            next_value_to_send_profile_questions = current_votes
+        else:
+            next_value_to_send_profile_questions = int(
+                next_value_to_send_profile_questions
             )
 
-            if not next_value_to_send_profile_questions:
-                next_value_to_send_profile_questions = current_votes
-            else:
-                next_value_to_send_profile_questions = int(
-                    next_value_to_send_profile_questions
-                )
-
-            if (
-                current_votes >= votes_to_send_profile_questions
-                and next_value_to_send_profile_questions == current_votes
-            ):
-                custom_logger("need_to_ask_about_profile: True")
-                next_value_to_send_profile_questions += 2
-                return True, next_value_to_send_profile_questions
+        if (
+            current_votes >= votes_to_send_profile_questions
+            and next_value_to_send_profile_questions == current_votes
+        ):
+            custom_logger("need_to_ask_about_profile: True")
+            next_value_to_send_profile_questions += 2
+            return True, next_value_to_send_profile_questions
         custom_logger("need_to_ask_about_profile: False")
         return False, -1
 
-    def is_valid_answer(self, answer, id_question):
+    async def is_valid_answer(self, answer, id_question):
         """
         check if answer is valid
         """
-        question: Question = None
-        for q in self.questions:
-            if q.id == id_question:
-                question = q
-                break
+        question: Question = self.question_bank.by_id.get(id_question)
         err = None
         if question:
             try:
                 answer = int(answer)
             except ValueError as err:
-                custom_logger(f"Answer {answer} is not a valid integer")
+                custom_logger("Answer is not a valid integer", data=str(answer))
                 return False, err
 
-            for a in question.answers:
-                if a["payload"] == answer:
-                    response = self.send_answer(answer, question)
-                    if response.status_code == 200:
-                        return True, err
-                    else:
-                        err = response.status_code
-                        return False, err
+            if answer in question.payloads:
+                response = await self.send_answer(answer, question)
+                if response.status_code == 200:
+                    return True, err
+                else:
+                    err = response.status_code
+                    return False, err
         return False, err
 
-    def send_answer(self, answer, question):
+    async def send_answer(self, answer, question):
         """
         send answer to ej-api
         """
         data = {question.put_payload: answer}
-        custom_logger(f"Sending answer {data} to ej-api")
+        custom_logger(f"Sending answer to ej-api", data=data)
         json_data = json.dumps(data)
-        response = self.ej_client.request(self.put_url(), json_data, put=True)
-        custom_logger(f"Response: {response.json()}")
+        response = await self.ej_client.request(self.put_url(), json_data, put=True)
+        custom_logger(f"Response", data=response.json)
+        if response.status_code == 200:
+            self.update_profile_snapshot(data, response.json())
         return response
 
+    def update_profile_snapshot(self, answer: dict, response_data):
+        """
+        Updates the cached profile with the answer sent to EJ, and with the profile
+        fields returned by EJ, so the profile isn't requested again.
+        """
+        returned_fields = {}
+        if isinstance(response_data, dict):
+            returned_fields = {
+                field: value
+                for field, value in response_data.items()
+                if field in PROFILE_FIELDS
+            }
+        self.set_profile_data({**self.get_profile_data(), **answer, **returned_fields})
+        PROFILE_CACHE.set(self.sender_id, self.get_profile_data())
+
     def put_url(self):
         return f"{profiles_route()}{self.user}/"
 
@@ -216,6 +239,61 @@ class Question:
         self.answers = answers
         self.change = change
         self.put_payload = put_payload
+        self.payloads = frozenset(answer["payload"] for answer in answers)
+
+
+@dataclass(frozen=True)
+class QuestionBank:
+    """
+    The profile questions of profile-questions.json, indexed by id and by the profile
+    field (change enum) they fill. The file is parsed once and the QuestionBank is
+    shared by every Profile; load() parses it again only if the file was modified.
+    """
+
+    questions: Tuple[Question, ...]
+    by_id: Mapping[int, Question]
+    by_change: Mapping[type, Tuple[Question, ...]]
+    random_questions: bool
+
+    @classmethod
+    def parse(cls, data: dict) -> "QuestionBank":
+        questions = tuple(
+            sorted(
+                (
+                    Question(
+                        int(question["id"]),
+                        question["body"],
+                        question["answers"],
+                        CHANGES[question["change"]],
+                        question["put_payload"],
+                    )
+                    for question in data["questions"]
+                ),
+                key=lambda question: question.id,
+            )
+        )
+        by_change = {}
+        for question in questions:
+            by_change[question.change] = by_change.get(question.change, ()) + (
+                question,
+            )
+        return cls(
+            questions,
+            MappingProxyType({question.id: question for question in questions}),
+            MappingProxyType(by_change),
+            data["random_questions"],
+        )
+
+    @classmethod
+    def load(cls, path: str = QUESTIONS_FILE) -> "QuestionBank":
+        modified_at = os.stat(path).st_mtime_ns
+        cached = _question_banks.get(path)
+        if cached and cached[0] == modified_at:
+            return cached[1]
+        with open(path) as f:
+            question_bank = cls.parse(json.load(f))
+        _question_banks[path] = (modified_at, question_bank)
+        return question_bank
 
 
 # Enums
@@ -256,3 +334,11 @@ class AgeRange(IntEnum):
     RANGE_4 = 4
     RANGE_5 = 5
     RANGE_6 = 6
+
+
+CHANGES = {
+    "Ethnicity": Ethnicity,
+    "Region": Region,
+    "Gender": Gender,
+    "AgeRange": AgeRange,
+}
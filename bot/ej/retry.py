@@ -0,0 +1,122 @@
+import asyncio
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+import functools
+import random
+import time
+
+from .metrics import METRICS
+from .settings import (
+    EJ_ACTION_BUDGET,
+    EJ_HTTP_MAX_RETRIES,
+    EJ_HTTP_RETRY_BASE_DELAY,
+    EJ_HTTP_RETRY_MAX_DELAY,
+    EJDeadlineExceededError,
+)
+
+_current_deadline: ContextVar = ContextVar("ej_action_deadline", default=None)
+
+
+@dataclass
+class Deadline:
+    """
+    Deadline is the time budget an action has to communicate with EJ. Every request
+    (and retry) sent while the action runs consumes the same budget.
+    """
+
+    budget: float
+    started_at: float = field(default_factory=time.monotonic)
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+    def remaining(self) -> float:
+        return self.budget - self.elapsed()
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    @staticmethod
+    def current() -> "Deadline":
+        """
+        Returns the deadline of the running action, or None outside of one.
+        """
+        return _current_deadline.get()
+
+
+@contextmanager
+def action_deadline(
+    budget: float = EJ_ACTION_BUDGET, action: str = None, detached: bool = False
+):
+    """
+    Sets the deadline shared by every EJ request sent inside the block. When the budget
+    runs out, EjClient raises EJDeadlineExceededError, which is handled by the action as
+    any other EJCommunicationError. Nested blocks reuse the outer deadline, unless
+    detached is True (e.g., background tasks, which outlive the action).
+
+    If action is given, its duration and whether it exceeded the budget are recorded
+    in METRICS.
+    """
+    deadline = Deadline.current()
+    if deadline is not None and not detached:
+        yield deadline
+        return
+    deadline = Deadline(budget)
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
+        if action:
+            METRICS.observe(
+                "ej_action_duration_seconds", deadline.elapsed(), action=action
+            )
+            if deadline.expired():
+                METRICS.increment("ej_action_budget_exceeded", action=action)
+
+
+def with_deadline(budget: float = EJ_ACTION_BUDGET):
+    """
+    Decorates a coroutine, so every EJ request it sends shares a single time budget
+    (see action_deadline).
+    """
+
+    def decorator(method):
+        @functools.wraps(method)
+        async def wrapper(*args, **kwargs):
+            with action_deadline(budget):
+                return await method(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter, shared by the EJ requests.
+
+    https://aws.amazon.com/blogs/architecture/exponential-backoff-and-jitter/
+    """
+
+    retries: int = EJ_HTTP_MAX_RETRIES
+    base_delay: float = EJ_HTTP_RETRY_BASE_DELAY
+    max_delay: float = EJ_HTTP_RETRY_MAX_DELAY
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+    async def wait(self, attempt: int, deadline: Deadline = None):
+        """
+        Waits before the next attempt, without blocking the event loop. Raises
+        EJDeadlineExceededError if the deadline would expire while waiting.
+        """
+        delay = self.backoff(attempt)
+        if deadline and delay >= deadline.remaining():
+            raise EJDeadlineExceededError
+        await asyncio.sleep(delay)
+
+
+RETRY_POLICY = RetryPolicy()
@@ -55,6 +55,10 @@ def comments_route():
     return f"{API_URL}/comments/"
 
 
+def comment_route(comment_id):
+    return f"{comments_route()}{comment_id}/"
+
+
 def my_profile_route():
     return f"{API_URL}/profiles/me/"
 
@@ -18,6 +18,134 @@ BP_EJ_COMPONENT_ID = os.getenv("BP_EJ_COMPONENT_ID", "")
 BOARD_ID = os.getenv("BOARD_ID", None)
 CONVERSATION_ID = os.getenv("CONVERSATION_ID", None)
 
+# HTTP connection pool shared by every request sent to the EJ API.
+EJ_HTTP_POOL_SIZE = int(os.getenv("EJ_HTTP_POOL_SIZE", 100))
+EJ_HTTP_MAX_RETRIES = int(os.getenv("EJ_HTTP_MAX_RETRIES", 2))
+EJ_HTTP_RETRY_BASE_DELAY = float(os.getenv("EJ_HTTP_RETRY_BASE_DELAY", 0.25))
+EJ_HTTP_RETRY_MAX_DELAY = float(os.getenv("EJ_HTTP_RETRY_MAX_DELAY", 2))
+EJ_HTTP_KEEPALIVE = os.getenv("EJ_HTTP_KEEPALIVE", "true").lower() == "true"
+EJ_HTTP_KEEPALIVE_TIMEOUT = float(os.getenv("EJ_HTTP_KEEPALIVE_TIMEOUT", 30))
+EJ_HTTP_DNS_CACHE_TTL = int(os.getenv("EJ_HTTP_DNS_CACHE_TTL", 300))
+
+# Access tokens expiring in less than EJ_TOKEN_REFRESH_MARGIN seconds are refreshed
+# before the request is sent.
+EJ_TOKEN_REFRESH_MARGIN = int(os.getenv("EJ_TOKEN_REFRESH_MARGIN", 30))
+
+# Circuit breaker: after EJ_CIRCUIT_FAILURE_THRESHOLD consecutive failed (or slower than
+# EJ_CIRCUIT_SLOW_CALL_DURATION seconds) requests, EJ requests fail immediately for
+# EJ_CIRCUIT_RESET_TIMEOUT seconds, when a single probe request is let through.
+EJ_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("EJ_CIRCUIT_FAILURE_THRESHOLD", 5))
+EJ_CIRCUIT_RESET_TIMEOUT = float(os.getenv("EJ_CIRCUIT_RESET_TIMEOUT", 30))
+EJ_CIRCUIT_SLOW_CALL_DURATION = float(os.getenv("EJ_CIRCUIT_SLOW_CALL_DURATION", 5))
+
+# If EJ_VOTE_OUTBOX is true, votes are stored in a SQLite database (EJ_VOTE_OUTBOX_PATH)
+# and confirmed to the participant right away, and sent to EJ in background every
+# EJ_VOTE_OUTBOX_FLUSH_INTERVAL seconds, up to EJ_VOTE_OUTBOX_MAX_ATTEMPTS times. The
+# database keeps the participants EJ tokens in plain text until their votes are sent.
+EJ_VOTE_OUTBOX = os.getenv("EJ_VOTE_OUTBOX", "false").lower() == "true"
+EJ_VOTE_OUTBOX_PATH = os.getenv("EJ_VOTE_OUTBOX_PATH", "vote_outbox.sqlite3")
+EJ_VOTE_OUTBOX_FLUSH_INTERVAL = float(os.getenv("EJ_VOTE_OUTBOX_FLUSH_INTERVAL", 2))
+EJ_VOTE_OUTBOX_MAX_ATTEMPTS = int(os.getenv("EJ_VOTE_OUTBOX_MAX_ATTEMPTS", 10))
+
+# Participants registered by ej.preregister_participants are stored in a SQLite
+# database (EJ_PREREGISTRATION_PATH), sending at most EJ_PREREGISTRATION_CONCURRENCY
+# requests at a time and EJ_PREREGISTRATION_RATE registrations per second. The database
+# keeps the participants EJ tokens in plain text, so it is only readable by its owner.
+EJ_PREREGISTRATION_PATH = os.getenv(
+    "EJ_PREREGISTRATION_PATH", "preregistered_participants.sqlite3"
+)
+EJ_PREREGISTRATION_CONCURRENCY = int(os.getenv("EJ_PREREGISTRATION_CONCURRENCY", 10))
+EJ_PREREGISTRATION_RATE = float(os.getenv("EJ_PREREGISTRATION_RATE", 20))
+
+# EJ integration debug logs are written by a background thread (EJ_LOG_QUEUE), for a
+# EJ_LOG_SAMPLE_RATE fraction of the participants, with passwords and tokens redacted
+# unless EJ_LOG_REDACT is false.
+EJ_LOG_QUEUE = os.getenv("EJ_LOG_QUEUE", "true").lower() == "true"
+EJ_LOG_SAMPLE_RATE = float(os.getenv("EJ_LOG_SAMPLE_RATE", 1))
+EJ_LOG_REDACT = os.getenv("EJ_LOG_REDACT", "true").lower() == "true"
+
+# A snapshot of the EJ integration METRICS is logged (INFO level) at most once every
+# EJ_METRICS_LOG_INTERVAL seconds, when an EJ action runs. 0 disables it.
+EJ_METRICS_LOG_INTERVAL = float(os.getenv("EJ_METRICS_LOG_INTERVAL", 60))
+
+# Timeouts, in seconds, of the EJ requests. Requests sent on every vote (random-comment
+# and user-statistics) use a tighter read timeout than the default one, and registration
+# and authentication a looser one.
+EJ_HTTP_CONNECT_TIMEOUT = float(os.getenv("EJ_HTTP_CONNECT_TIMEOUT", 2))
+EJ_HTTP_READ_TIMEOUT = float(os.getenv("EJ_HTTP_READ_TIMEOUT", 5))
+EJ_HTTP_FAST_READ_TIMEOUT = float(os.getenv("EJ_HTTP_FAST_READ_TIMEOUT", 3))
+EJ_HTTP_SLOW_READ_TIMEOUT = float(os.getenv("EJ_HTTP_SLOW_READ_TIMEOUT", 15))
+
+# Conversations and boards data is cached for EJ_METADATA_CACHE_TTL seconds, keeping at
+# most EJ_METADATA_CACHE_SIZE responses.
+EJ_METADATA_CACHE_SIZE = int(os.getenv("EJ_METADATA_CACHE_SIZE", 256))
+EJ_METADATA_CACHE_TTL = float(os.getenv("EJ_METADATA_CACHE_TTL", 300))
+
+# If EJ_EXTERNAL_AUTHENTICATION_WEBHOOK is true, Brasil Participativo notifies the bot
+# (addons.external_authentication) when a participant completes the authentication,
+# and EJ is not requested before that.
+EJ_EXTERNAL_AUTHENTICATION_WEBHOOK = (
+    os.getenv("EJ_EXTERNAL_AUTHENTICATION_WEBHOOK", "false").lower() == "true"
+)
+
+# Signed external authentication links are reused until EJ_AUTH_LINK_REFRESH_MARGIN
+# seconds before TOKEN_EXPIRATION_TIME, keeping at most EJ_AUTH_LINK_CACHE_SIZE links.
+EJ_AUTH_LINK_CACHE_SIZE = int(os.getenv("EJ_AUTH_LINK_CACHE_SIZE", 10000))
+EJ_AUTH_LINK_REFRESH_MARGIN = float(os.getenv("EJ_AUTH_LINK_REFRESH_MARGIN", 60))
+
+# Credentials derived from the sender_id (password, secret_id and email) are kept for
+# the last EJ_USER_CREDENTIALS_CACHE_SIZE participants.
+EJ_USER_CREDENTIALS_CACHE_SIZE = int(os.getenv("EJ_USER_CREDENTIALS_CACHE_SIZE", 10000))
+
+# Participants known to be registered in EJ are authenticated right away, while the
+# others are registered first. The last EJ_REGISTERED_PARTICIPANTS_CACHE_SIZE
+# participants are kept for EJ_REGISTERED_PARTICIPANTS_CACHE_TTL seconds.
+EJ_REGISTERED_PARTICIPANTS_CACHE_SIZE = int(
+    os.getenv("EJ_REGISTERED_PARTICIPANTS_CACHE_SIZE", 100000)
+)
+EJ_REGISTERED_PARTICIPANTS_CACHE_TTL = float(
+    os.getenv("EJ_REGISTERED_PARTICIPANTS_CACHE_TTL", 86400)
+)
+
+# Participants profile data is cached for EJ_PROFILE_CACHE_TTL seconds, keeping at most
+# EJ_PROFILE_CACHE_SIZE profiles.
+EJ_PROFILE_CACHE_SIZE = int(os.getenv("EJ_PROFILE_CACHE_SIZE", 10000))
+EJ_PROFILE_CACHE_TTL = float(os.getenv("EJ_PROFILE_CACHE_TTL", 600))
+
+# Participants statistics are requested once and updated locally with the participant
+# votes. They are requested again every EJ_STATISTICS_RECONCILE_EVERY votes, when the
+# participant comments, or after EJ_STATISTICS_CACHE_TTL seconds.
+EJ_STATISTICS_CACHE_SIZE = int(os.getenv("EJ_STATISTICS_CACHE_SIZE", 10000))
+EJ_STATISTICS_CACHE_TTL = float(os.getenv("EJ_STATISTICS_CACHE_TTL", 300))
+EJ_STATISTICS_RECONCILE_EVERY = int(os.getenv("EJ_STATISTICS_RECONCILE_EVERY", 5))
+
+# A vote sent again for the same comment in less than EJ_SUBMITTED_VOTES_CACHE_TTL
+# seconds (e.g., double taps) is not sent to EJ.
+EJ_SUBMITTED_VOTES_CACHE_SIZE = int(os.getenv("EJ_SUBMITTED_VOTES_CACHE_SIZE", 10000))
+EJ_SUBMITTED_VOTES_CACHE_TTL = float(os.getenv("EJ_SUBMITTED_VOTES_CACHE_TTL", 60))
+
+# Comments content is cached for EJ_COMMENT_CACHE_TTL seconds, keeping at most
+# EJ_COMMENT_CACHE_SIZE comments.
+EJ_COMMENT_CACHE_SIZE = int(os.getenv("EJ_COMMENT_CACHE_SIZE", 5000))
+EJ_COMMENT_CACHE_TTL = float(os.getenv("EJ_COMMENT_CACHE_TTL", 600))
+
+# Comments to vote are requested in bulk, keeping at most EJ_COMMENT_QUEUE_SIZE comments
+# per participant, and requested again when less than EJ_COMMENT_QUEUE_REFILL_AT are
+# left. Queues are kept for EJ_COMMENT_QUEUE_CACHE_TTL seconds.
+EJ_COMMENT_QUEUE_SIZE = int(os.getenv("EJ_COMMENT_QUEUE_SIZE", 50))
+EJ_COMMENT_QUEUE_REFILL_AT = int(os.getenv("EJ_COMMENT_QUEUE_REFILL_AT", 2))
+EJ_COMMENT_QUEUE_CACHE_SIZE = int(os.getenv("EJ_COMMENT_QUEUE_CACHE_SIZE", 10000))
+EJ_COMMENT_QUEUE_CACHE_TTL = float(os.getenv("EJ_COMMENT_QUEUE_CACHE_TTL", 1800))
+
+# Total time, in seconds, an action may spend on EJ requests (including retries).
+# The budget of a single action can be set with EJ_ACTION_BUDGET_<ACTION_NAME>, e.g.,
+# EJ_ACTION_BUDGET_ACTION_ASK_VOTE=5.
+EJ_ACTION_BUDGET = float(os.getenv("EJ_ACTION_BUDGET", 10))
+
+
+def get_action_budget(action_name: str) -> float:
+    return float(os.getenv(f"EJ_ACTION_BUDGET_{action_name.upper()}", EJ_ACTION_BUDGET))
+
 
 class EJCommunicationError(Exception):
     """Raised when request from EJ doesnt supply waited response"""
@@ -25,3 +153,11 @@ class EJCommunicationError(Exception):
     def __init_(self, expression, message):
         self.expression = expression
         self.message = "Não consegui conectar na EJ"
+
+
+class EJDeadlineExceededError(EJCommunicationError):
+    """Raised when an action runs out of time budget to communicate with EJ"""
+
+
+class EJCircuitOpenError(EJCommunicationError):
+    """Raised when EJ requests are not sent because the circuit breaker is open"""
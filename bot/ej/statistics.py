@@ -0,0 +1,72 @@
+from dataclasses import dataclass
+from typing import Dict
+
+from .cache import STATISTICS_CACHE
+from .metrics import METRICS
+from .settings import EJ_STATISTICS_RECONCILE_EVERY
+
+
+@dataclass
+class ParticipationCounters:
+    """
+    The participant statistics requested to EJ, updated locally with the votes sent by
+    the bot, so the checkers don't need to request them on every turn. The counters are
+    reconciled with EJ (i.e., requested again) every EJ_STATISTICS_RECONCILE_EVERY
+    local votes, or as soon as they look wrong.
+    """
+
+    statistics: Dict
+    local_votes: int = 0
+
+    def count_vote(self) -> bool:
+        """
+        Updates the counters with a new vote. Returns False if they must be reconciled
+        with EJ.
+        """
+        statistics = self.statistics
+        self.local_votes += 1
+        for counter in ("votes", "comments"):
+            if counter in statistics:
+                statistics[counter] += 1
+        if "missing_votes" in statistics:
+            statistics["missing_votes"] -= 1
+        total_comments = statistics.get("total_comments")
+        if total_comments and "participation_ratio" in statistics:
+            statistics["participation_ratio"] = (
+                statistics.get("comments", 0) / total_comments
+            )
+        return self.local_votes < EJ_STATISTICS_RECONCILE_EVERY and self.is_consistent()
+
+    def is_consistent(self) -> bool:
+        statistics = self.statistics
+        if statistics.get("missing_votes", 0) < 0:
+            return False
+        total_comments = statistics.get("total_comments")
+        return total_comments is None or statistics.get("comments", 0) <= total_comments
+
+
+def get_participation_counters(sender_id, conversation_id) -> ParticipationCounters:
+    return STATISTICS_CACHE.get((sender_id, str(conversation_id)))
+
+
+def set_participation_counters(sender_id, conversation_id, statistics: Dict):
+    STATISTICS_CACHE.set(
+        (sender_id, str(conversation_id)), ParticipationCounters(dict(statistics))
+    )
+
+
+def count_vote(sender_id, conversation_id):
+    """
+    Updates the participant counters with a vote sent to EJ. If there are no counters,
+    or they must be reconciled, they are removed, so the next statistics are requested
+    to EJ.
+    """
+    counters = get_participation_counters(sender_id, conversation_id)
+    if counters is None or not counters.count_vote():
+        if counters is not None:
+            METRICS.increment("ej_statistics_reconciliations")
+        invalidate_participation_counters(sender_id, conversation_id)
+
+
+def invalidate_participation_counters(sender_id, conversation_id):
+    STATISTICS_CACHE.invalidate((sender_id, str(conversation_id)))
@@ -1,4 +1,6 @@
 import base64
+from dataclasses import dataclass
+import functools
 import hashlib
 import json
 from typing import Any, Text
@@ -7,12 +9,37 @@ from actions.logger import custom_logger
 from ej.auth import ExternalAuthenticationManager
 from ej.ej_client import EjClient
 
+from .cache import REGISTERED_PARTICIPANTS
+from .metrics import METRICS
+from .preregistration import PREREGISTERED_PARTICIPANTS
 from .routes import auth_route, registration_route
 from .settings import (
+    EJ_USER_CREDENTIALS_CACHE_SIZE,
     SECRET_KEY,
+    EJCommunicationError,
 )
 
 
+@dataclass(frozen=True)
+class UserCredentials:
+    email: str
+    password: str
+    secret_id: str
+
+
+@functools.lru_cache(maxsize=EJ_USER_CREDENTIALS_CACHE_SIZE)
+def get_user_credentials(sender_id: Text) -> UserCredentials:
+    """
+    Returns the EJ credentials of a participant. They only depend on the sender_id (and
+    SECRET_KEY), so they are derived once and reused by the following actions.
+    """
+    return UserCredentials(
+        email=f"{User.remove_special(sender_id)}-opinion-bot@mail.com",
+        password=User.get_password(sender_id),
+        secret_id=ExternalAuthenticationManager.to_sha256(sender_id),
+    )
+
+
 class User:
     ANONYMOUS_USER_NAME = "Participante anônimo"
 
@@ -25,23 +52,29 @@ class User:
             )
             self.name = self._get_name_from_tracker()
             self.display_name = self.name
-            self.email = f"{self.remove_special(self.sender_id)}-opinion-bot@mail.com"
-            self.password = self._get_password()
+            credentials = get_user_credentials(self.sender_id)
+            self.email = credentials.email
+            self.password = credentials.password
             self.password_confirm = self.password
-            self.secret_id = ExternalAuthenticationManager.to_sha256(self.sender_id)
+            self.secret_id = credentials.secret_id
             self.ej_client = EjClient(tracker)
 
     def _get_password(self):
-        if SECRET_KEY and self.sender_id:
-            seed = f"{self.sender_id}{SECRET_KEY}".encode()
+        return User.get_password(self.sender_id)
+
+    @staticmethod
+    def get_password(sender_id: Text):
+        if SECRET_KEY and sender_id:
+            seed = f"{sender_id}{SECRET_KEY}".encode()
             seed_base64 = base64.b64encode(seed)
-            ruby_compatible_base64 = self.get_base64_ruby_compatible_format(
+            ruby_compatible_base64 = User.get_base64_ruby_compatible_format(
                 seed_base64.decode()
             )
             return hashlib.sha256(ruby_compatible_base64.encode()).hexdigest()
         raise Exception("could not generate user password")
 
-    def get_base64_ruby_compatible_format(self, seed_base64: Text):
+    @staticmethod
+    def get_base64_ruby_compatible_format(seed_base64: Text):
         """
          this is a hack to generate the same Decidim-encoded string for the user password.
          Every 60 characters, we need to insert a \n character in the Python base64-encoded string.
@@ -49,13 +82,10 @@ class User:
 
         https://ruby-doc.org/stdlib-2.5.3/libdoc/base64/rdoc/Base64.html
         """
-        ruby_compatible_base64 = ""
-        for count, char in enumerate(list(seed_base64)):
-            ruby_compatible_base64 += char
-            if not (count + 1) % 60:
-                ruby_compatible_base64 += "\n"
-        ruby_compatible_base64 += "\n"
-        return ruby_compatible_base64
+        full_lines = len(seed_base64) // 60 * 60
+        lines = [seed_base64[i : i + 60] + "\n" for i in range(0, full_lines, 60)]
+        lines.append(seed_base64[full_lines:] + "\n")
+        return "".join(lines)
 
     def registration_data(self):
         return json.dumps(
@@ -82,40 +112,55 @@ class User:
             }
         )
 
-    def authenticate(self):
+    async def authenticate(self):
         """
         Differentiate user type of login (using phone number or anonymous)
         providing the current flow for conversation
         """
         access_token = self.tracker.get_slot("access_token")
         refresh_token = self.tracker.get_slot("refresh_token")
-        custom_logger(f"TOKENS: {access_token} {refresh_token}")
+        custom_logger(
+            "TOKENS",
+            data={"access_token": access_token, "refresh_token": refresh_token},
+        )
         if access_token and refresh_token:
             return self.tracker
 
-        response = None
-        try:
-            custom_logger(
-                f"Requesting new token for the participant", data=self.auth_data()
-            )
-            response = self.ej_client.request(auth_route(), self.auth_data())
-            if response.status_code != 200:
-                custom_logger(f"EJ API ERROR", data=response.json())
-                raise Exception
-        except Exception:
-            custom_logger(
-                f"Failed to request token, trying to create the participant",
-                data=self.registration_data(),
-            )
-            response = self.ej_client.request(
-                registration_route(), self.registration_data()
-            )
-            if response.status_code != 201:
-                custom_logger(f"EJ API ERROR", data=response.json())
-                raise Exception("COULD NOT CREATE USER")
+        tokens = PREREGISTERED_PARTICIPANTS.take(self.sender_id)
+        if tokens:
+            METRICS.increment("ej_authentication_path", path="preregistration")
+            REGISTERED_PARTICIPANTS.set(self.sender_id, True)
+            self._set_tokens(tokens)
+            return self.tracker
 
-        custom_logger(f"EJ API RESPONSE", data=response.json())
-        response_data = response.json()
+        # New participants are registered right away, instead of after a failed
+        # authentication. Participants not seen yet by this process (e.g., after a
+        # restart) are authenticated once their registration fails. Communication errors
+        # are raised right away, without trying the other path.
+        if REGISTERED_PARTICIPANTS.get(self.sender_id):
+            METRICS.increment("ej_authentication_path", path="auth")
+            response = await self._request_token()
+            if response is None:
+                METRICS.increment("ej_authentication_fallbacks", path="auth")
+                response = await self._register()
+                if response is None:
+                    raise EJCommunicationError("could not create the participant.")
+        else:
+            METRICS.increment("ej_authentication_path", path="registration")
+            response = await self._register()
+            if response is None:
+                METRICS.increment("ej_authentication_fallbacks", path="registration")
+                response = await self._request_token()
+                if response is None:
+                    raise EJCommunicationError(
+                        "could not authenticate the participant."
+                    )
+        REGISTERED_PARTICIPANTS.set(self.sender_id, True)
+
+        custom_logger(f"EJ API RESPONSE", data=response.json)
+        self._set_tokens(response.json())
+
+    def _set_tokens(self, response_data):
         self.tracker.slots["access_token"] = response_data["access_token"]
         self.tracker.slots["refresh_token"] = response_data["refresh_token"]
         self.has_completed_registration = response_data["has_completed_registration"]
@@ -123,6 +168,34 @@ class User:
             "has_completed_registration"
         ] = self.has_completed_registration
 
+    async def _request_token(self):
+        """
+        Returns the EJ response with the participant tokens, or None if EJ refuses to
+        authenticate the participant.
+        """
+        custom_logger(f"Requesting new token for the participant", data=self.auth_data)
+        response = await self.ej_client.request(
+            auth_route(), self.auth_data(), retry_safe=True
+        )
+        if response.status_code != 200:
+            custom_logger(f"EJ API ERROR", data=response.json)
+            return None
+        return response
+
+    async def _register(self):
+        """
+        Returns the EJ response with the new participant tokens, or None if EJ refuses to
+        register the participant (e.g., the participant is already registered).
+        """
+        custom_logger(f"Creating the participant", data=self.registration_data)
+        response = await self.ej_client.request(
+            registration_route(), self.registration_data()
+        )
+        if response.status_code != 201:
+            custom_logger(f"EJ API ERROR", data=response.json)
+            return None
+        return response
+
     def _get_name_from_tracker(self):
         metadata = self.tracker.latest_message.get("metadata")
         if metadata:
@@ -132,7 +205,8 @@ class User:
                 return metadata.get("contact_name")
         return User.ANONYMOUS_USER_NAME
 
-    def remove_special(self, line):
+    @staticmethod
+    def remove_special(line):
         for char in ":+":
             line = line.replace(char, "")
         return line
@@ -1,16 +1,20 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from enum import Enum
 import json
+import sqlite3
 from typing import Any, Dict, List, Text
 
-import requests
-
 from actions.logger import custom_logger
 from rasa_sdk import Tracker
 from rasa_sdk.events import FollowupAction, SlotSet
 
-from .routes import auth_headers, votes_route
+from .cache import SUBMITTED_VOTES
+from .ej_client import EjClient
+from .metrics import METRICS
+from .routes import votes_route
 from .settings import *
+from .statistics import count_vote
+from .vote_outbox import VOTE_OUTBOX
 
 
 class SlotsType(Enum):
@@ -78,7 +82,9 @@ class Vote:
     vote_slot_value: Text
     tracker: Tracker
     channel: Text = ""
-    token: Text = ""
+    # the tokens of the participant are kept out of the logs.
+    token: Text = field(default="", repr=False)
+    ej_client: EjClient = field(default=None, repr=False)
 
     def __post_init__(self):
         input_channel = self.tracker.get_latest_input_channel()
@@ -87,6 +93,7 @@ class Vote:
         else:
             self.channel = input_channel
         self.token = self.tracker.get_slot("access_token")
+        self.ej_client = EjClient(self.tracker)
 
     @staticmethod
     def is_valid(vote_option):
@@ -105,10 +112,8 @@ class Vote:
         """
         return str(self.vote_slot_value) == "-"
 
-    def create(self, comment_id):
-        import time
-
-        def _request():
+    async def create(self, comment_id):
+        async def _request():
             body = json.dumps(
                 {
                     "comment": comment_id,
@@ -116,12 +121,16 @@ class Vote:
                     "channel": self.channel,
                 }
             )
-            response = requests.post(
-                votes_route(),
-                data=body,
-                headers=auth_headers(self.token),
+            # EJ keeps a single vote per participant and comment, so resending the
+            # same vote after a failure has no additional effect.
+            response = await self.ej_client.request(
+                votes_route(), body, retry_safe=True
             )
+            if not response.ok:
+                raise EJCommunicationError(f"EJ answered {response.status_code}.")
             response = response.json()
+            # only votes accepted by EJ are counted in the participant statistics.
+            count_vote(self.tracker.sender_id, self.tracker.get_slot("conversation_id"))
             custom_logger(f"REGISTERED VOTE", data=response)
             return response
 
@@ -129,12 +138,52 @@ class Vote:
             return
 
         if Vote.is_valid(self.vote_slot_value):
-            try:
-                return _request()
-            except Exception as e:
-                time.sleep(2)
-            try:
-                return _request()
-            except Exception as e:
-                custom_logger(f"ERROR POSTING VOTE \n {e}")
-                raise EJCommunicationError
+            # Double taps and Rasa retries send the same vote again. They are answered
+            # with the response of the first submission, without sending it to EJ.
+            # Votes EJ didn't accept are not stored, so they can be sent again.
+            key = (
+                self.tracker.sender_id,
+                str(self.tracker.get_slot("conversation_id")),
+                str(comment_id),
+            )
+            submitted_vote = SUBMITTED_VOTES.get(key)
+            if submitted_vote and submitted_vote["choice"] == self.vote_slot_value:
+                METRICS.increment("ej_duplicated_votes_absorbed")
+                custom_logger(f"DUPLICATED VOTE ABSORBED")
+                return submitted_vote["response"]
+            if EJ_VOTE_OUTBOX:
+                response = await self._add_to_outbox(comment_id)
+            else:
+                try:
+                    response = await _request()
+                except Exception as e:
+                    custom_logger("ERROR POSTING VOTE", data=str(e))
+                    raise EJCommunicationError
+            SUBMITTED_VOTES.set(
+                key, {"choice": self.vote_slot_value, "response": response}
+            )
+            return response
+
+    async def _add_to_outbox(self, comment_id):
+        """
+        Stores the vote in VOTE_OUTBOX, to be sent to EJ in background, and counts it
+        in the participant statistics right away.
+        """
+        conversation_id = self.tracker.get_slot("conversation_id")
+        try:
+            await VOTE_OUTBOX.add(
+                self.tracker.sender_id,
+                conversation_id,
+                comment_id,
+                int(self.vote_slot_value),
+                self.channel,
+                self.tracker.get_slot("access_token"),
+                self.tracker.get_slot("refresh_token"),
+            )
+        except sqlite3.Error as error:
+            custom_logger("could not add the vote to the outbox", data=str(error))
+            raise EJCommunicationError
+        VOTE_OUTBOX.start_flusher()
+        count_vote(self.tracker.sender_id, conversation_id)
+        custom_logger(f"VOTE ADDED TO OUTBOX")
+        return {"comment": comment_id, "choice": int(self.vote_slot_value)}
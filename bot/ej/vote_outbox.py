@@ -0,0 +1,313 @@
+import asyncio
+import atexit
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+import functools
+import json
+import os
+import sqlite3
+import time
+from typing import Dict, List, Tuple
+
+from actions.logger import custom_logger
+
+from .ej_client import EjClient, close_session
+from .metrics import METRICS
+from .retry import action_deadline
+from .routes import votes_route
+from .settings import (
+    EJ_VOTE_OUTBOX_FLUSH_INTERVAL,
+    EJ_VOTE_OUTBOX_MAX_ATTEMPTS,
+    EJ_VOTE_OUTBOX_PATH,
+)
+
+# Status codes of votes EJ will never accept (e.g., the comment was removed). The other
+# errors are retried.
+REJECTED_STATUS = (400, 403, 404)
+
+
+@dataclass
+class OutboxVote:
+    id: int
+    sender_id: str
+    conversation_id: str
+    comment_id: str
+    choice: int
+    channel: str
+    access_token: str
+    refresh_token: str
+    created_at: float
+    attempts: int
+
+    def body(self) -> str:
+        return json.dumps(
+            {"comment": self.comment_id, "choice": self.choice, "channel": self.channel}
+        )
+
+
+class VoteOutbox:
+    """
+    VoteOutbox stores the participants votes in a local SQLite database, so the vote can
+    be confirmed to the participant before it is sent to EJ. A background task (see
+    start_flusher) sends the stored votes to EJ:
+
+    - a participant has a single vote per comment in the outbox, so voting again before
+      the vote is sent replaces it, and EJ ignores votes sent twice;
+    - votes of a participant are sent in the order they were cast. If one fails, the
+      following ones wait for the next flush;
+    - failed votes are retried up to EJ_VOTE_OUTBOX_MAX_ATTEMPTS times, and the tokens
+      refreshed while sending them are stored for the next attempts.
+
+    The database is only accessed from the outbox thread, so SQLite doesn't block the
+    event loop. The participants tokens are stored in plain text, so the database file
+    is only readable by its owner.
+
+    The outbox depth and the age of its oldest vote are exported as METRICS gauges.
+    """
+
+    def __init__(self, path: str = EJ_VOTE_OUTBOX_PATH):
+        self.path = path
+        self._connection: sqlite3.Connection = None
+        self._flusher: asyncio.Task = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="outbox")
+        self._resumed = False
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._connection = sqlite3.connect(
+                self.path, isolation_level=None, check_same_thread=False
+            )
+            os.chmod(self.path, 0o600)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS votes (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    sender_id TEXT NOT NULL,
+                    conversation_id TEXT NOT NULL,
+                    comment_id TEXT NOT NULL,
+                    choice INTEGER NOT NULL,
+                    channel TEXT,
+                    access_token TEXT,
+                    refresh_token TEXT,
+                    created_at REAL NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    UNIQUE (sender_id, comment_id)
+                )
+                """
+            )
+        return self._connection
+
+    async def _run(self, function, *args):
+        """
+        Runs a database call in the outbox thread. Once the executor is shut down (see
+        flush_on_shutdown), the call runs in the calling thread.
+        """
+        if self._executor is None:
+            return function(*args)
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, functools.partial(function, *args)
+        )
+
+    async def add(self, *vote):
+        """
+        Stores a vote (see insert) in the outbox.
+        """
+        await self._run(self.insert, *vote)
+
+    def insert(
+        self,
+        sender_id,
+        conversation_id,
+        comment_id,
+        choice: int,
+        channel: str,
+        access_token: str,
+        refresh_token: str,
+    ):
+        self.connection.execute(
+            """
+            INSERT INTO votes (
+                sender_id, conversation_id, comment_id, choice, channel,
+                access_token, refresh_token, created_at
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (sender_id, comment_id) DO UPDATE SET
+                choice = excluded.choice,
+                access_token = excluded.access_token,
+                refresh_token = excluded.refresh_token
+            """,
+            (
+                str(sender_id),
+                str(conversation_id),
+                str(comment_id),
+                choice,
+                channel,
+                access_token,
+                refresh_token,
+                time.time(),
+            ),
+        )
+        self.update_metrics()
+
+    def pending(self) -> Dict[str, List[OutboxVote]]:
+        """
+        Returns the votes in the outbox, by participant, in the order they were cast.
+        """
+        rows = self.connection.execute(
+            """
+            SELECT id, sender_id, conversation_id, comment_id, choice, channel,
+                access_token, refresh_token, created_at, attempts
+            FROM votes ORDER BY id
+            """
+        ).fetchall()
+        votes = {}
+        for row in rows:
+            vote = OutboxVote(*row)
+            votes.setdefault(vote.sender_id, []).append(vote)
+        return votes
+
+    def remove(self, vote: OutboxVote):
+        # the participant may have changed the vote while it was being sent.
+        self.connection.execute(
+            "DELETE FROM votes WHERE id = ? AND choice = ?", (vote.id, vote.choice)
+        )
+
+    def add_attempt(self, vote: OutboxVote):
+        self.connection.execute(
+            "UPDATE votes SET attempts = attempts + 1 WHERE id = ?", (vote.id,)
+        )
+
+    def update_tokens(
+        self, sender_id: str, refresh_token: str, new_tokens: Tuple[str, str]
+    ):
+        """
+        Replaces the tokens of the votes of a participant stored with refresh_token,
+        after EJ refreshed them.
+        """
+        self.connection.execute(
+            """
+            UPDATE votes SET access_token = ?, refresh_token = ?
+            WHERE sender_id = ? AND refresh_token = ?
+            """,
+            (*new_tokens, sender_id, refresh_token),
+        )
+
+    def depth(self) -> int:
+        return self.connection.execute("SELECT COUNT(*) FROM votes").fetchone()[0]
+
+    def oldest_age(self) -> float:
+        created_at = self.connection.execute(
+            "SELECT MIN(created_at) FROM votes"
+        ).fetchone()[0]
+        return time.time() - created_at if created_at else 0
+
+    def update_metrics(self):
+        METRICS.set_gauge("ej_vote_outbox_depth", self.depth())
+        METRICS.set_gauge("ej_vote_outbox_oldest_age_seconds", self.oldest_age())
+
+    async def flush(self):
+        """
+        Sends the votes in the outbox to EJ. Participants are flushed concurrently, and
+        the votes of each participant in order.
+        """
+        pending = await self._run(self.pending)
+        await asyncio.gather(*[self._flush_participant(v) for v in pending.values()])
+        await self._run(self.update_metrics)
+
+    async def _flush_participant(self, votes: List[OutboxVote]):
+        tokens = (votes[0].access_token, votes[0].refresh_token)
+        ej_client = EjClient(None, access_token=tokens[0], refresh_token=tokens[1])
+        try:
+            for vote in votes:
+                if not await self._send(ej_client, vote):
+                    return
+        finally:
+            if ej_client.get_tokens() != tokens:
+                await self._run(
+                    self.update_tokens,
+                    votes[0].sender_id,
+                    tokens[1],
+                    ej_client.get_tokens(),
+                )
+
+    async def _send(self, ej_client: EjClient, vote: OutboxVote) -> bool:
+        """
+        Sends vote to EJ. Returns False if it must be sent again later.
+        """
+        try:
+            with action_deadline(detached=True):
+                response = await ej_client.request(
+                    votes_route(), vote.body(), retry_safe=True
+                )
+        except Exception as error:
+            response = None
+            custom_logger("ERROR POSTING VOTE", data=str(error))
+        if response is not None and response.ok:
+            await self._run(self.remove, vote)
+            METRICS.increment("ej_vote_outbox_sent")
+            return True
+        if response is not None and response.status_code in REJECTED_STATUS:
+            await self._run(self.remove, vote)
+            METRICS.increment("ej_vote_outbox_rejected")
+            return True
+        if vote.attempts + 1 >= EJ_VOTE_OUTBOX_MAX_ATTEMPTS:
+            await self._run(self.remove, vote)
+            METRICS.increment("ej_vote_outbox_dropped")
+            custom_logger(
+                "DROPPING VOTE",
+                data=lambda: {"id": vote.id, "attempts": vote.attempts + 1},
+            )
+            return True
+        await self._run(self.add_attempt, vote)
+        return False
+
+    def start_flusher(self):
+        """
+        Starts the background task that flushes the outbox, if it isn't running. The task
+        stops once the outbox is empty, and it is started again by the next vote.
+        """
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.ensure_future(self._flush_until_empty())
+
+    def resume(self):
+        """
+        Starts the flusher once per process, so the votes left in the outbox by a previous
+        run are sent without waiting for a new vote. It is called by the EJ actions (see
+        ej_action), since the action server event loop isn't running when they are
+        imported.
+        """
+        if self._resumed:
+            return
+        self._resumed = True
+        if os.path.exists(self.path):
+            self.start_flusher()
+
+    async def _flush_until_empty(self):
+        while True:
+            await self.flush()
+            if not await self._run(self.depth):
+                return
+            await asyncio.sleep(EJ_VOTE_OUTBOX_FLUSH_INTERVAL)
+
+    def flush_on_shutdown(self):
+        """
+        Sends the votes left in the outbox before the process exits.
+        """
+        # the executor threads are stopped before the atexit callbacks run.
+        self._executor = None
+        if self._connection is None or not self.depth():
+            return
+
+        async def flush():
+            await self.flush()
+            await close_session()
+
+        try:
+            asyncio.run(flush())
+        except Exception as error:
+            custom_logger("could not flush the vote outbox", data=str(error))
+
+
+VOTE_OUTBOX = VoteOutbox()
+atexit.register(VOTE_OUTBOX.flush_on_shutdown)
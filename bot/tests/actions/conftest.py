@@ -1,8 +1,66 @@
-from unittest.mock import Mock, patch, mock_open
+import json
+from unittest.mock import AsyncMock, Mock, patch
 from rasa_sdk import Tracker
 import pytest
+import pytest_asyncio
+from bot.ej.cache import (
+    AUTH_LINK_CACHE,
+    COMMENT_CACHE,
+    METADATA_CACHE,
+    PROFILE_CACHE,
+    REGISTERED_PARTICIPANTS,
+    STATISTICS_CACHE,
+    SUBMITTED_VOTES,
+)
+from bot.ej.comment_queue import COMMENT_QUEUES
+from bot.ej.circuit_breaker import CircuitBreaker
+from ej.cache import AUTH_LINK_CACHE as EJ_AUTH_LINK_CACHE
+from ej.cache import METADATA_CACHE as EJ_METADATA_CACHE
+from ej.cache import PROFILE_CACHE as EJ_PROFILE_CACHE
+from ej.cache import COMMENT_CACHE as EJ_COMMENT_CACHE
+from ej.cache import REGISTERED_PARTICIPANTS as EJ_REGISTERED_PARTICIPANTS
+from ej.cache import STATISTICS_CACHE as EJ_STATISTICS_CACHE
+from ej.cache import SUBMITTED_VOTES as EJ_SUBMITTED_VOTES
+from ej.comment_queue import COMMENT_QUEUES as EJ_COMMENT_QUEUES
 from bot.ej.conversation import Conversation
-from bot.ej.profile import Profile
+from bot.ej.profile import Profile, QuestionBank
+
+
+@pytest.fixture(autouse=True)
+def circuit_breaker():
+    """
+    Gives each test a closed circuit breaker, so failures simulated by a test don't
+    make the requests of the following ones fail fast.
+    """
+    breaker = CircuitBreaker()
+    with patch("ej.ej_client.CIRCUIT_BREAKER", breaker), patch(
+        "bot.ej.ej_client.CIRCUIT_BREAKER", breaker
+    ):
+        yield breaker
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    yield
+    for cache in (
+        METADATA_CACHE,
+        EJ_METADATA_CACHE,
+        PROFILE_CACHE,
+        EJ_PROFILE_CACHE,
+        COMMENT_QUEUES,
+        EJ_COMMENT_QUEUES,
+        COMMENT_CACHE,
+        EJ_COMMENT_CACHE,
+        STATISTICS_CACHE,
+        EJ_STATISTICS_CACHE,
+        SUBMITTED_VOTES,
+        EJ_SUBMITTED_VOTES,
+        REGISTERED_PARTICIPANTS,
+        EJ_REGISTERED_PARTICIPANTS,
+        AUTH_LINK_CACHE,
+        EJ_AUTH_LINK_CACHE,
+    ):
+        cache.clear()
 
 
 @pytest.fixture
@@ -177,8 +235,7 @@ def extra_data():
 @pytest.fixture
 def conversation(tracker, comment, extra_data):
     conversation = Conversation(tracker, extra_data)
-    conversation.get_next_comment = Mock()
-    conversation.get_next_comment = lambda: comment
+    conversation.get_next_comment = AsyncMock(return_value=comment)
     return conversation
 
 
@@ -192,6 +249,19 @@ def livechat_metadata():
     return {"agent": "livechat"}
 
 
+@pytest.fixture
+def ej_send():
+    """
+    Replaces the transport used by EjClient to reach the EJ API. The ej package is
+    imported both as `ej` and `bot.ej`, so both copies of EjClient are patched.
+    """
+    mock_send = AsyncMock()
+    with patch("ej.ej_client.EjClient._send", mock_send), patch(
+        "bot.ej.ej_client.EjClient._send", mock_send
+    ):
+        yield mock_send
+
+
 @pytest.fixture
 def mock_ej_client_response():
     return {
@@ -224,20 +294,23 @@ mock_json_content = """
 """
 
 
-@pytest.fixture
-def mock_profile(mock_ej_client_response, tracker):
-    with patch("bot.ej.profile.EjClient.request") as mock_request, patch(
-        "bot.ej.profile.Profile.send_answer"
+@pytest_asyncio.fixture
+async def mock_profile(mock_ej_client_response, tracker):
+    with patch(
+        "bot.ej.profile.EjClient.request", new_callable=AsyncMock
+    ) as mock_request, patch(
+        "bot.ej.profile.Profile.send_answer", new_callable=AsyncMock
     ) as mock_send_answer, patch(
-        "bot.ej.ej_client.EjClient._refresh_access_token"
+        "bot.ej.ej_client.EjClient._refresh_access_token", new_callable=AsyncMock
     ) as mock_refresh_token, patch(
-        "builtins.open", mock_open(read_data=mock_json_content)
+        "bot.ej.profile.QuestionBank.load",
+        return_value=QuestionBank.parse(json.loads(mock_json_content)),
     ):
+        mock_request.return_value = Mock(status_code=200)
         mock_request.return_value.json.return_value = mock_ej_client_response
-        mock_request.return_value.status_code = 200
         mock_send_answer.return_value = Mock(status_code=200)
         mock_refresh_token.return_value = None
 
-        mock_profile = Profile(tracker)
+        mock_profile = await Profile.get(tracker)
         mock_profile.ej_client.access_token = "mock_access_token"
         return mock_profile
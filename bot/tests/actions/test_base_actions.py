@@ -0,0 +1,62 @@
+import os
+from unittest.mock import patch
+
+import pytest
+from rasa_sdk import Tracker
+from rasa_sdk.events import SlotSet
+
+from actions.base_actions import ej_action
+from ej.retry import Deadline
+
+
+def get_tracker():
+    slots = {"access_token": "old-access", "refresh_token": "refresh"}
+    return Tracker("sender", slots, {}, [], False, None, {}, "action_listen")
+
+
+class FakeAction:
+    def __init__(self, refresh=True):
+        self.refresh = refresh
+
+    def _refresh_tokens(self, tracker):
+        if self.refresh:
+            tracker.slots["access_token"] = "new-access"
+
+    @ej_action
+    async def run(self, dispatcher, tracker, domain):
+        self._refresh_tokens(tracker)
+        return [SlotSet("vote", None)]
+
+    @ej_action
+    async def get_budget(self, tracker):
+        return Deadline.current().budget
+
+    @ej_action
+    async def validate_vote(self, slot_value, dispatcher, tracker, domain):
+        self._refresh_tokens(tracker)
+        return {"vote": slot_value}
+
+
+class TestEjAction:
+    @pytest.mark.asyncio
+    async def test_refreshed_tokens_are_returned_as_events(self):
+        events = await FakeAction().run(None, get_tracker(), {})
+        assert events == [SlotSet("vote", None), SlotSet("access_token", "new-access")]
+
+    @pytest.mark.asyncio
+    async def test_refreshed_tokens_are_returned_as_validated_slots(self):
+        slots = await FakeAction().validate_vote("1", None, get_tracker(), {})
+        assert slots == {"vote": "1", "access_token": "new-access"}
+
+    @pytest.mark.asyncio
+    async def test_slots_are_unchanged_without_refresh(self):
+        action = FakeAction(refresh=False)
+        assert await action.run(None, get_tracker(), {}) == [SlotSet("vote", None)]
+        assert await action.validate_vote(
+            dispatcher=None, tracker=get_tracker(), domain={}, slot_value="1"
+        ) == {"vote": "1"}
+
+    @pytest.mark.asyncio
+    async def test_action_budget_can_be_overridden(self):
+        with patch.dict(os.environ, {"EJ_ACTION_BUDGET_FAKEACTION": "3"}):
+            assert await FakeAction().get_budget(get_tracker()) == 3
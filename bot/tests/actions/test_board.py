@@ -1,21 +1,24 @@
 import pytest
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, Mock, patch
 from ej.boards import Board
 from ej.conversation import Conversation
 from ej.ej_client import EjClient
 
 
 class TestBoard:
+    @pytest.mark.asyncio
     @patch("ej.boards.EjClient")
-    def test_board_initialization(self, MockEjClient, tracker):
+    async def test_board_initialization(self, MockEjClient, tracker):
         mock_api_instance = MockEjClient.return_value
+        mock_api_instance.request = AsyncMock()
+        mock_api_instance.request.return_value.json = Mock()
         mock_api_instance.request.return_value.json.return_value = {
             "title": "Test Board",
             "description": "Test Description",
             "conversations": [],
         }
 
-        board = Board(1, tracker)
+        board = await Board.get(1, tracker)
 
         assert board.id == 1
         assert board.title == "Test Board"
@@ -23,17 +26,20 @@ class TestBoard:
         assert isinstance(board.conversations, list)
         assert len(board.conversations) == 0
 
+    @pytest.mark.asyncio
     @patch("ej.boards.EjClient")
     @patch("ej.boards.Conversation")
-    def test_set_board(self, MockConversation, MockEjClient, tracker):
+    async def test_set_board(self, MockConversation, MockEjClient, tracker):
         mock_api_instance = MockEjClient.return_value
+        mock_api_instance.request = AsyncMock()
+        mock_api_instance.request.return_value.json = Mock()
         mock_api_instance.request.return_value.json.return_value = {
             "title": "Test Board",
             "description": "Test Description",
             "conversations": [{"id": 1}, {"id": 2}],
         }
 
-        board = Board(1, tracker)
+        board = await Board.get(1, tracker)
 
         assert board.title == "Test Board"
         assert board.description == "Test Description"
@@ -0,0 +1,75 @@
+import asyncio
+from unittest.mock import patch
+
+import pytest
+
+from bot.ej.cache import METADATA_CACHE, TTLCache
+from bot.ej.conversation import Conversation
+from bot.ej.ej_client import EjResponse
+from bot.ej.metrics import METRICS
+
+
+class TestTTLCache:
+    def test_get_and_set(self):
+        cache = TTLCache("test", maxsize=2, ttl=60)
+        assert cache.get("key") is None
+        cache.set("key", "value")
+        assert cache.get("key") == "value"
+
+    def test_expired_entries_are_misses(self):
+        cache = TTLCache("test", maxsize=2, ttl=60)
+        cache.set("key", "value")
+        with patch("bot.ej.cache.time.monotonic", return_value=10**9):
+            assert cache.get("key") is None
+        assert len(cache) == 0
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = TTLCache("test", maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.get("c") == 3
+
+    def test_hits_and_misses_are_counted(self):
+        METRICS.reset()
+        cache = TTLCache("test", maxsize=2, ttl=60)
+        cache.get("key")
+        cache.set("key", "value")
+        cache.get("key")
+        cache.get("key")
+        assert METRICS.get("ej_cache_hits", cache="test") == 2
+        assert METRICS.get("ej_cache_misses", cache="test") == 1
+
+
+class TestMetadataCache:
+    @pytest.mark.asyncio
+    async def test_conversation_is_requested_once(self, ej_send, tracker):
+        ej_send.return_value = EjResponse(200, b'{"id": 1, "text": "conversation"}')
+        for _ in range(3):
+            conversation = await Conversation.get(1, tracker)
+            assert conversation["text"] == "conversation"
+        ej_send.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_errors_are_not_cached(self, ej_send, tracker):
+        ej_send.return_value = EjResponse(503, b'{"detail": "unavailable"}')
+        await Conversation.get(1, tracker)
+        await Conversation.get(1, tracker)
+        assert ej_send.call_count == 2
+        assert len(METADATA_CACHE) == 0
+
+    @pytest.mark.asyncio
+    async def test_concurrent_requests_are_coalesced(self, ej_send, tracker):
+        async def send(*args, **kwargs):
+            await asyncio.sleep(0)
+            return EjResponse(200, b'{"id": 1, "text": "conversation"}')
+
+        ej_send.side_effect = send
+        conversations = await asyncio.gather(
+            *[Conversation.get(1, tracker) for _ in range(5)]
+        )
+        assert all(conversation["id"] == 1 for conversation in conversations)
+        ej_send.assert_called_once()
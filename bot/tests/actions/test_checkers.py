@@ -1,23 +1,28 @@
+from unittest.mock import Mock, patch
+
 import pytest
+from actions.checkers.setup_actions_checkers import get_slots
 from actions.checkers.vote_actions_checkers import (
     CheckRemainingCommentsSlots,
     CheckExternalAuthenticationSlots,
     CheckNextCommentSlots,
     CheckUserCanAddCommentsSlots,
+    CheckNeedToAskAboutProfile,
 )
 from actions.checkers.api_error_checker import EJClientErrorManager
 from ej.vote import SlotsType
 
 
 class TestCheckRemainingCommentsSlots:
-    def test_initialization(self, tracker, dispatcher, conversation_statistics):
+    @pytest.mark.asyncio
+    async def test_initialization(self, tracker, dispatcher, conversation_statistics):
         with pytest.raises(Exception):
             checker = CheckRemainingCommentsSlots(
                 dispatcher=dispatcher,
                 conversation_statistics={"missing_votes": 0},
                 slots_type="foo",
             )
-            checker.has_slots_to_return()
+            await checker.has_slots_to_return()
 
         conversation_statistics["missing_votes"] = 1
         checker = CheckRemainingCommentsSlots(
@@ -26,7 +31,7 @@ class TestCheckRemainingCommentsSlots:
             slots_type=SlotsType.DICT,
         )
 
-        assert checker.has_slots_to_return()
+        assert await checker.has_slots_to_return()
         assert type(checker.slots) == dict
 
         conversation_statistics["missing_votes"] = 0
@@ -37,10 +42,13 @@ class TestCheckRemainingCommentsSlots:
         )
 
         checker.set_slots()
-        assert checker.has_slots_to_return()
+        assert await checker.has_slots_to_return()
         assert type(checker.slots) == list
 
-    def test_keep_vote_form_running(self, tracker, dispatcher, conversation_statistics):
+    @pytest.mark.asyncio
+    async def test_keep_vote_form_running(
+        self, tracker, dispatcher, conversation_statistics
+    ):
         conversation_statistics["missing_votes"] = 2
 
         checker = CheckRemainingCommentsSlots(
@@ -49,10 +57,13 @@ class TestCheckRemainingCommentsSlots:
             slots_type=SlotsType.DICT,
         )
 
-        assert checker.has_slots_to_return()
+        assert await checker.has_slots_to_return()
         assert checker.slots == {"vote": None}
 
-    def test_completed_vote_form(self, tracker, dispatcher, conversation_statistics):
+    @pytest.mark.asyncio
+    async def test_completed_vote_form(
+        self, tracker, dispatcher, conversation_statistics
+    ):
         conversation_statistics["missing_votes"] = 0
 
         checker = CheckRemainingCommentsSlots(
@@ -61,12 +72,15 @@ class TestCheckRemainingCommentsSlots:
             slots_type=SlotsType.DICT,
         )
 
-        assert checker.has_slots_to_return()
+        assert await checker.has_slots_to_return()
         assert checker.slots == {"vote": "-", "participant_voted_in_all_comments": True}
 
 
 class TestCheckUserCanAddComentsSlots:
-    def test_has_slots_to_return(self, tracker, dispatcher, conversation_statistics):
+    @pytest.mark.asyncio
+    async def test_has_slots_to_return(
+        self, tracker, dispatcher, conversation_statistics
+    ):
         tracker.set_slot("participant_can_add_comments", True)
         conversation_statistics["comments"] = 4
 
@@ -77,10 +91,13 @@ class TestCheckUserCanAddComentsSlots:
             slot_value="1",
         )
 
-        assert checker.has_slots_to_return()
+        assert await checker.has_slots_to_return()
         assert checker.slots == {"vote": "1", "ask_for_a_comment": True}
 
-    def test_has_no_slots_to_return(self, tracker, dispatcher, conversation_statistics):
+    @pytest.mark.asyncio
+    async def test_has_no_slots_to_return(
+        self, tracker, dispatcher, conversation_statistics
+    ):
         tracker.set_slot("participant_can_add_comments", True)
         conversation_statistics["comments"] = 5
 
@@ -91,12 +108,13 @@ class TestCheckUserCanAddComentsSlots:
             slot_value="1",
         )
 
-        assert not checker.has_slots_to_return()
+        assert not await checker.has_slots_to_return()
         assert checker.slots == []
 
 
 class TestCheckNextCommentSlots:
-    def test_has_slots_to_return(
+    @pytest.mark.asyncio
+    async def test_has_slots_to_return(
         self, tracker, dispatcher, conversation, conversation_statistics, comment
     ):
         checker = CheckNextCommentSlots(
@@ -105,13 +123,16 @@ class TestCheckNextCommentSlots:
             conversation=conversation,
             conversation_statistics=conversation_statistics,
         )
-        assert checker.has_slots_to_return()
+        assert await checker.has_slots_to_return()
         assert checker.slots[1].get("value") == comment["content"]
         assert checker.slots[3].get("value") == comment["id"]
 
 
 class TestCheckExternalAuthenticationSlots:
-    def test_has_slots_to_return(self, tracker, dispatcher, conversation_statistics):
+    @pytest.mark.asyncio
+    async def test_has_slots_to_return(
+        self, tracker, dispatcher, conversation_statistics
+    ):
         tracker.set_slot("anonymous_votes_limit", 2)
         conversation_statistics["comments"] = 2
         checker = CheckExternalAuthenticationSlots(
@@ -120,12 +141,37 @@ class TestCheckExternalAuthenticationSlots:
             conversation_statistics=conversation_statistics,
             slots_type=SlotsType.LIST,
         )
-        assert checker.has_slots_to_return()
+        assert await checker.has_slots_to_return()
         print(checker.slots)
         assert checker.slots[0].get("value") == "-"
         assert checker.slots[1].get("value") == True
 
 
+class TestSetupSlots:
+    @pytest.fixture(autouse=True)
+    def external_authentication(self):
+        with patch("ej.auth.EXTERNAL_AUTHENTICATION_HOST", "https://bp"), patch(
+            "ej.auth.BP_EJ_COMPONENT_ID", "processes/1/f/2"
+        ), patch("ej.auth.JWT_SECRET", "test-secret" * 4):
+            yield
+
+    def participant(self, tracker, has_completed_registration):
+        return Mock(
+            tracker=tracker,
+            secret_id="secret",
+            has_completed_registration=has_completed_registration,
+        )
+
+    def test_auth_link_of_anonymous_participant(self, tracker, conversation):
+        slots = get_slots(conversation, self.participant(tracker, False))
+        assert slots[0]["name"] == "auth_link"
+        assert slots[0]["value"].startswith("https://bp/processes/1/f/2/")
+
+    def test_registered_participant_has_no_auth_link(self, tracker, conversation):
+        slots = get_slots(conversation, self.participant(tracker, True))
+        assert "auth_link" not in [slot["name"] for slot in slots]
+
+
 class TestEJApiErrorManager:
     def test_get_slots(self):
         ej_client_error_manager = EJClientErrorManager()
@@ -138,3 +184,19 @@ class TestEJApiErrorManager:
         slots = ej_client_error_manager.get_slots(as_dict=True)
         assert slots.get("vote") == "-"
         assert slots.get("ej_client_connection_error") == True
+
+
+class TestCheckNeedToAskAboutProfile:
+    @pytest.mark.asyncio
+    async def test_profile_is_not_requested_when_no_question_is_due(
+        self, tracker, dispatcher, conversation, conversation_statistics, ej_send
+    ):
+        conversation.send_profile_question = False
+        checker = CheckNeedToAskAboutProfile(
+            tracker=tracker,
+            dispatcher=dispatcher,
+            conversation=conversation,
+            conversation_statistics=conversation_statistics,
+        )
+        assert not await checker.has_slots_to_return()
+        ej_send.assert_not_called()
@@ -0,0 +1,96 @@
+from unittest.mock import patch
+
+import aiohttp
+import pytest
+
+from bot.ej.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from bot.ej.ej_client import EjClient
+from bot.ej.settings import EJCircuitOpenError, EJCommunicationError
+
+from .test_retry import NO_WAIT_POLICY, URL, FakeSession
+
+
+@pytest.fixture
+def breaker():
+    return CircuitBreaker(failure_threshold=2, reset_timeout=30, slow_call_duration=1)
+
+
+@pytest.fixture
+def fake_session(breaker):
+    session = FakeSession()
+    with patch("bot.ej.ej_client.get_session", return_value=session), patch(
+        "bot.ej.ej_client.RETRY_POLICY", NO_WAIT_POLICY
+    ), patch("bot.ej.ej_client.CIRCUIT_BREAKER", breaker):
+        yield session
+
+
+class TestCircuitBreaker:
+    def test_opens_after_consecutive_failures(self, breaker):
+        breaker.record(False, 0.1)
+        assert breaker.state == CLOSED
+        breaker.record(False, 0.1)
+        assert breaker.state == OPEN
+        with pytest.raises(EJCircuitOpenError):
+            breaker.before_request()
+
+    def test_slow_calls_are_failures(self, breaker):
+        breaker.record(True, 2)
+        breaker.record(True, 2)
+        assert breaker.state == OPEN
+
+    def test_success_resets_failures(self, breaker):
+        breaker.record(False, 0.1)
+        breaker.record(True, 0.1)
+        breaker.record(False, 0.1)
+        assert breaker.state == CLOSED
+
+    def test_half_open_lets_a_single_probe_through(self, breaker):
+        breaker.record(False, 0.1)
+        breaker.record(False, 0.1)
+        breaker.opened_at -= breaker.reset_timeout
+        probe = breaker.before_request()
+        assert breaker.state == HALF_OPEN
+        with pytest.raises(EJCircuitOpenError):
+            breaker.before_request()
+        breaker.record(True, 0.1, probe)
+        assert breaker.state == CLOSED
+
+    def test_failed_probe_opens_the_circuit(self, breaker):
+        breaker.record(False, 0.1)
+        breaker.record(False, 0.1)
+        breaker.opened_at -= breaker.reset_timeout
+        probe = breaker.before_request()
+        breaker.record(False, 0.1, probe)
+        assert breaker.state == OPEN
+        with pytest.raises(EJCircuitOpenError):
+            breaker.before_request()
+
+    def test_stale_results_are_ignored_while_not_closed(self, breaker):
+        breaker.record(False, 0.1)
+        breaker.record(False, 0.1)
+        # a request sent before the circuit opened succeeds late.
+        breaker.record(True, 0.1)
+        assert breaker.state == OPEN
+        with pytest.raises(EJCircuitOpenError):
+            breaker.before_request()
+
+        breaker.opened_at -= breaker.reset_timeout
+        probe = breaker.before_request()
+        breaker.record(True, 0.1)
+        assert breaker.state == HALF_OPEN
+        with pytest.raises(EJCircuitOpenError):
+            breaker.before_request()
+        breaker.record(True, 0.1, probe)
+        assert breaker.state == CLOSED
+
+    @pytest.mark.asyncio
+    async def test_open_circuit_fails_fast(self, breaker, fake_session):
+        fake_session.outcomes = [aiohttp.ClientConnectionError()] * 2
+        with pytest.raises(EJCommunicationError):
+            await EjClient(None)._send("POST", URL, payload="{}")
+        with pytest.raises(EJCommunicationError):
+            await EjClient(None)._send("POST", URL, payload="{}")
+        assert breaker.state == OPEN
+        with pytest.raises(EJCircuitOpenError):
+            await EjClient(None)._send("GET", URL)
+        assert fake_session.calls == 2
@@ -1,5 +1,23 @@
-from ej.ej_client import EjClient
+import asyncio
+import json
+from unittest.mock import patch
+
+import pytest
+
+from actions.vote_actions import ValidateVoteForm
+from ej.cache import COMMENT_CACHE
+from ej.comment import Comment
+from ej.comment_queue import COMMENT_QUEUES, CommentQueue
+from ej.ej_client import EjClient, EjResponse
 from ej.conversation import Conversation
+from ej.routes import (
+    comment_route,
+    random_comment_route,
+    user_pending_comments_route,
+    user_statistics_route,
+)
+from ej.settings import EJCommunicationError
+from ej.vote import VoteDialogue
 
 
 class TestConversation:
@@ -58,3 +76,145 @@ class TestConversation:
     def test_pause_to_ask_comment(self):
         assert Conversation.pause_to_ask_comment("PAUSA PARA PEDIR COMENTARIO")
         assert not Conversation.pause_to_ask_comment("OTHER VALUE")
+
+
+def comment_data(comment_id, status="approved"):
+    return {
+        "content": f"comment {comment_id}",
+        "status": status,
+        "links": {"self": f"/api/v1/comments/{comment_id}/"},
+    }
+
+
+def json_response(data, status=200):
+    return EjResponse(status, json.dumps(data).encode())
+
+
+class TestCommentQueue:
+    def test_voted_comments_are_dropped(self):
+        queue = CommentQueue()
+        queue.extend(["1", "2", "2"])
+        assert len(queue) == 2
+        queue.mark_voted(1)
+        assert queue.pop() == "2"
+        assert queue.pop() is None
+        queue.extend(["1"])
+        assert len(queue) == 0
+
+    def test_retain(self):
+        queue = CommentQueue()
+        queue.extend(["1", "2", "3"])
+        assert queue.retain(["3", "1", "4"]) == ["2"]
+        assert list(queue.comment_ids) == ["1", "3"]
+
+    @pytest.mark.asyncio
+    async def test_comments_are_served_from_the_queue(self, tracker, ej_send):
+        ej_send.return_value = json_response([comment_data(i) for i in range(5)])
+        served = set()
+        for _ in range(3):
+            conversation = Conversation(tracker)
+            comment = await conversation.get_next_comment()
+            served.add(comment["id"])
+        assert len(served) == 3
+        assert ej_send.call_args.args[1] == user_pending_comments_route(conversation.id)
+        ej_send.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_queue_is_refilled_when_running_low(self, tracker, ej_send):
+        ej_send.return_value = json_response([comment_data(i) for i in range(3)])
+        conversation = Conversation(tracker)
+        await conversation.get_next_comment()
+        await conversation.get_next_comment()
+        await asyncio.sleep(0)
+        assert ej_send.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_voted_comment_is_not_served(self, tracker, ej_send):
+        ej_send.return_value = json_response([comment_data(1)])
+        conversation = Conversation(tracker)
+        await conversation.prefetch_next_comment(voted_comment_id="1")
+        ej_send.return_value = json_response([])
+        assert await conversation.get_next_comment() is None
+
+    @pytest.mark.asyncio
+    async def test_prefetch_errors_are_ignored(
+        self, tracker, dispatcher, conversation_statistics, ej_send
+    ):
+        def send(method, url, *args, **kwargs):
+            if url == user_pending_comments_route("1"):
+                raise EJCommunicationError
+            if url == user_statistics_route("1"):
+                return json_response(conversation_statistics)
+            return json_response({}, 201)
+
+        ej_send.side_effect = send
+        tracker.set_slot("current_comment_id", "1")
+        tracker.set_slot("next_count_to_send_profile_question", 5)
+        queue = CommentQueue()
+        queue.extend(["2"])
+        COMMENT_QUEUES.set((tracker.sender_id, "1"), queue)
+        slots = await ValidateVoteForm().validate_vote("1", dispatcher, tracker, {})
+        assert slots == VoteDialogue.restart_vote_form_slots()
+        requested = [call.args[1] for call in ej_send.call_args_list]
+        assert user_pending_comments_route("1") in requested
+        assert list(queue.comment_ids) == ["2"]
+
+    @pytest.mark.asyncio
+    async def test_random_comment_is_requested_if_queue_fails(self, tracker, ej_send):
+        ej_send.side_effect = [json_response({}, 404), json_response(comment_data(7))]
+        conversation = Conversation(tracker)
+        comment = await conversation.get_next_comment()
+        assert comment["id"] == "7"
+        assert ej_send.call_args.args[1] == random_comment_route(conversation.id)
+
+
+class TestCommentCache:
+    @pytest.mark.asyncio
+    async def test_comments_content_is_shared(self, tracker, ej_send):
+        ej_send.return_value = json_response([comment_data(1)])
+        comment = await Conversation(tracker).get_next_comment()
+        COMMENT_QUEUES.clear()
+        assert await Comment.get(comment["id"], None) == comment
+        assert comment["content"] == "comment 1"
+
+    @pytest.mark.asyncio
+    async def test_rejected_comments_are_not_served(self, tracker, ej_send):
+        ej_send.return_value = json_response([comment_data(1), comment_data(2)])
+        conversation = Conversation(tracker)
+        comment = await conversation.get_next_comment()
+        other_id = "2" if comment["id"] == "1" else "1"
+        Comment.invalidate(other_id)
+        ej_send.return_value = json_response(comment_data(other_id, "rejected"))
+        assert (
+            await conversation._pop_comment(conversation._get_comment_queue()) is None
+        )
+        assert ej_send.call_args.args[1] == comment_route(other_id)
+        assert COMMENT_CACHE.get(other_id) is None
+
+    @pytest.mark.asyncio
+    async def test_comments_no_longer_pending_are_dropped_on_refill(
+        self, tracker, ej_send
+    ):
+        ej_send.return_value = json_response([comment_data(i) for i in range(4)])
+        conversation = Conversation(tracker)
+        await conversation.prefetch_next_comment()
+        ej_send.return_value = json_response(
+            [comment_data(0), comment_data(1, "rejected"), comment_data(3)]
+        )
+        with patch("ej.conversation.EJ_COMMENT_QUEUE_REFILL_AT", 10):
+            await conversation.prefetch_next_comment()
+        queue = conversation._get_comment_queue()
+        assert sorted(queue.comment_ids) == ["0", "3"]
+        assert COMMENT_CACHE.get("1") is None
+        # comment 2 may still be pending for the other participants.
+        assert COMMENT_CACHE.get("2") is not None
+        assert COMMENT_CACHE.get("3") is not None
+
+    @pytest.mark.asyncio
+    async def test_edited_comments_are_updated(self, tracker, ej_send):
+        ej_send.return_value = json_response([comment_data(1)])
+        await Conversation(tracker).prefetch_next_comment()
+        edited = {**comment_data(1), "content": "edited comment"}
+        ej_send.return_value = json_response([edited])
+        await Conversation(tracker).prefetch_next_comment()
+        assert COMMENT_CACHE.get("1")["content"] == "edited comment"
@@ -1,10 +1,22 @@
-from unittest.mock import Mock, patch
+import asyncio
+import time
+from unittest.mock import Mock
 
+import jwt
 import pytest
+from rasa_sdk import Tracker
 
 from bot.ej.comment import Comment
 from bot.ej.settings import *
 from bot.ej.conversation import Conversation, EJCommunicationError
+from bot.ej.ej_client import (
+    EjClient,
+    EjResponse,
+    close_session,
+    get_session,
+    get_token_expiration,
+)
+from bot.ej.metrics import METRICS
 from bot.ej.routes import *
 from bot.ej.user import User
 from bot.ej.vote import Vote
@@ -18,91 +30,253 @@ SENDER_ID = "mock_rasa_sender_id"
 class TestAPIClass:
     """tests ej.api API class"""
 
-    @patch("bot.ej.ej_client.requests.post")
-    def test_create_user_in_ej_with_rasa_id(self, mock_post, tracker):
-        mock_post.return_value = Mock(ok=True)
+    @pytest.mark.asyncio
+    async def test_create_user_in_ej_with_rasa_id(self, ej_send, tracker):
+        ej_send.return_value = Mock(ok=True)
         user = User(tracker)
-        user.authenticate()
+        await user.authenticate()
         assert user.ej_client.access_token == "1234"
         assert user.name == "mr_davidCarlos"
 
-    @patch("bot.ej.ej_client.requests.get")
-    def test_get_random_comment_in_ej(self, mock_get, tracker):
+    @pytest.mark.asyncio
+    async def test_get_random_comment_in_ej(self, ej_send, tracker):
         response_value = {
             "content": "This is the comment text",
             "links": {"self": "http://localhost:8000/api/v1/comments/1/"},
         }
-        mock_get.return_value = Mock(ok=True)
-        mock_get.return_value.status_code = 200
-        mock_get.return_value.json.return_value = response_value
+        ej_send.return_value = Mock(ok=True)
+        ej_send.return_value.status_code = 200
+        ej_send.return_value.json.return_value = response_value
         conversation = Conversation(tracker)
-        response = conversation.get_next_comment()
+        response = await conversation.get_next_comment()
         assert response["content"] == response_value["content"]
         assert response["id"] == "1"
 
-    @patch("bot.ej.ej_client.requests.get")
-    def test_get_random_comment_in_ej_forbidden_response(self, mock_get, tracker):
-        mock_get.return_value.status_code = 500
+    @pytest.mark.asyncio
+    async def test_get_random_comment_in_ej_forbidden_response(self, ej_send, tracker):
+        ej_send.return_value.status_code = 500
         with pytest.raises(EJCommunicationError):
             conversation = Conversation(tracker)
-            conversation.get_next_comment()
+            await conversation.get_next_comment()
 
-    @patch("bot.ej.ej_client.requests.get")
-    def test_get_user_conversation_statistics(self, mock_get, tracker):
+    @pytest.mark.asyncio
+    async def test_get_user_conversation_statistics(self, ej_send, tracker):
         statistics_mock = {
             "votes": 3,
             "missing_votes": 6,
         }
-        mock_get.return_value = Mock(ok=True)
-        mock_get.return_value.json.return_value = statistics_mock
+        ej_send.return_value = Mock(ok=True)
+        ej_send.return_value.json.return_value = statistics_mock
         conversation = Conversation(tracker)
-        response = conversation.get_participant_statistics()
+        response = await conversation.get_participant_statistics()
         assert response["votes"] == statistics_mock["votes"]
         assert response["missing_votes"] == statistics_mock["missing_votes"]
 
-    @patch("bot.ej.ej_client.requests.get")
-    def test_get_user_conversation_statistics_error_status(self, mock_get, tracker):
-        mock_get.return_value = Mock(status=404), "not found"
+    @pytest.mark.asyncio
+    async def test_statistics_are_updated_locally_with_votes(self, ej_send, tracker):
+        ej_send.return_value = EjResponse(200, b'{"votes": 3, "missing_votes": 6}')
+        conversation = Conversation(tracker)
+        await conversation.get_participant_statistics()
+        statistics = await Conversation(tracker).get_participant_statistics()
+        assert statistics["votes"] == 3
+        assert ej_send.call_count == 1
+
+        ej_send.return_value = EjResponse(201, b'{"created": true}')
+        await Vote("1", tracker).create(COMMENT_ID)
+        statistics = await conversation.get_participant_statistics()
+        assert statistics["votes"] == 4
+        assert statistics["missing_votes"] == 5
+        assert ej_send.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_refused_votes_are_not_counted(self, ej_send, tracker):
+        ej_send.return_value = EjResponse(200, b'{"votes": 3, "missing_votes": 6}')
+        conversation = Conversation(tracker)
+        await conversation.get_participant_statistics()
+
+        for status in (400, 500):
+            ej_send.return_value = EjResponse(status, b'{"detail": "error"}')
+            with pytest.raises(EJCommunicationError):
+                await Vote("1", tracker).create(COMMENT_ID)
+        statistics = await conversation.get_participant_statistics()
+        assert statistics == {"votes": 3, "missing_votes": 6}
+        assert ej_send.call_count == 3
+
+    @pytest.mark.asyncio
+    async def test_get_user_conversation_statistics_error_status(
+        self, ej_send, tracker
+    ):
+        ej_send.return_value = Mock(status=404), "not found"
         with pytest.raises(EJCommunicationError):
             conversation = Conversation(tracker)
-            conversation.get_participant_statistics()
+            await conversation.get_participant_statistics()
 
-    @patch("bot.ej.vote.requests.post")
-    def test_send_user_vote(self, mock_post, tracker):
+    @pytest.mark.asyncio
+    async def test_send_user_vote(self, ej_send, tracker):
         vote_response_mock = {"created": True}
-        mock_post.return_value = Mock(ok=True)
-        mock_post.return_value.json.return_value = vote_response_mock
+        ej_send.return_value = Mock(ok=True)
+        ej_send.return_value.json.return_value = vote_response_mock
         vote = Vote("0", tracker)
-        response = vote.create(COMMENT_ID)
+        response = await vote.create(COMMENT_ID)
         assert response["created"]
 
-    @patch("bot.ej.vote.requests.post")
-    def test_send_user_vote_error_status(self, mock_post, tracker):
-        mock_post.return_value = Mock(status=401), "forbidden"
+    @pytest.mark.asyncio
+    async def test_duplicated_votes_are_absorbed(self, ej_send, tracker):
+        METRICS.reset()
+        ej_send.return_value = EjResponse(201, b'{"created": true}')
+        for _ in range(3):
+            response = await Vote("1", tracker).create(COMMENT_ID)
+            assert response["created"]
+        ej_send.assert_called_once()
+        assert METRICS.get("ej_duplicated_votes_absorbed") == 2
+
+        await Vote("-1", tracker).create(COMMENT_ID)
+        assert ej_send.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_refused_votes_can_be_sent_again(self, ej_send, tracker):
+        METRICS.reset()
+        ej_send.return_value = EjResponse(400, b'{"detail": "invalid vote"}')
+        for _ in range(2):
+            with pytest.raises(EJCommunicationError):
+                await Vote("1", tracker).create(COMMENT_ID)
+        assert ej_send.call_count == 2
+        assert METRICS.get("ej_duplicated_votes_absorbed") == 0
+
+        ej_send.return_value = EjResponse(201, b'{"created": true}')
+        assert (await Vote("1", tracker).create(COMMENT_ID))["created"]
+
+    @pytest.mark.asyncio
+    async def test_send_user_vote_error_status(self, ej_send, tracker):
+        ej_send.return_value = Mock(status=401), "forbidden"
         with pytest.raises(Exception):
             tracker = Mock()
             tracker.get_latest_input_channel = lambda: "foo"
             tracker.get_slot = lambda x: "foo"
             vote = Vote("0", tracker)
-            vote.create(COMMENT_ID)
+            await vote.create(COMMENT_ID)
 
-    @patch("bot.ej.comment.requests.post")
-    def test_send_user_comment(self, mock_post, tracker):
+    @pytest.mark.asyncio
+    async def test_send_user_comment(self, ej_send, tracker):
         vote_response_mock = {"created": True, "content": "content"}
-        mock_post.return_value = Mock(ok=True)
-        mock_post.return_value.json.return_value = vote_response_mock
+        ej_send.return_value = Mock(ok=True)
+        ej_send.return_value.json.return_value = vote_response_mock
 
         comment = Comment(CONVERSATION_ID, "xpto", tracker)
-        response = comment.create()
+        response = await comment.create()
         assert response["created"]
         assert response["content"] == "content"
 
-    @patch("bot.ej.comment.requests.post")
-    def test_send_user_comment_error_status(self, mock_post, tracker):
-        mock_post.return_value = Mock(status=404), "conversation not found"
+    @pytest.mark.asyncio
+    async def test_send_user_comment_error_status(self, ej_send, tracker):
+        ej_send.return_value = Mock(status=404), "conversation not found"
         with pytest.raises(EJCommunicationError):
             comment = Comment(CONVERSATION_ID, "xpto", tracker)
-            comment.create()
+            await comment.create()
+
+
+class TestEjSession:
+    """tests the pooled session shared by the EJ requests"""
+
+    @pytest.mark.asyncio
+    async def test_session_is_shared_between_requests(self):
+        assert get_session() is get_session()
+        await close_session()
+
+    @pytest.mark.asyncio
+    async def test_session_pool_size(self):
+        connector = get_session().connector
+        assert connector.limit == EJ_HTTP_POOL_SIZE
+        assert connector.use_dns_cache
+        await close_session()
+
+    def test_session_of_previous_loop_is_closed(self):
+        async def create_session():
+            return get_session()
+
+        previous_session = asyncio.run(create_session())
+        connector = previous_session.connector
+        session = asyncio.run(create_session())
+        assert session is not previous_session
+        assert previous_session.closed
+        assert connector.closed
+        asyncio.run(close_session())
+
+    def test_response_body(self):
+        response = EjResponse(200, b'{"votes": 1}')
+        assert response.ok
+        assert response.json() == {"votes": 1}
+        assert not EjResponse(404).ok
+
+
+def token_expiring_in(seconds):
+    return jwt.encode(
+        {"exp": int(time.time()) + seconds}, "test-secret" * 4, algorithm="HS256"
+    )
+
+
+def tracker_with_tokens(access_token, refresh_token="refresh"):
+    slots = {"access_token": access_token, "refresh_token": refresh_token}
+    return Tracker("sender", slots, {}, [], False, None, {}, "action_listen")
+
+
+class TestTokenRefresh:
+    """tests the access token refresh before it expires"""
+
+    def test_token_expiration(self):
+        token = token_expiring_in(60)
+        assert (
+            get_token_expiration(token)
+            == jwt.decode(token, options={"verify_signature": False})["exp"]
+        )
+        assert get_token_expiration("not a jwt") is None
+
+    @pytest.mark.asyncio
+    async def test_expiring_token_is_refreshed_before_request(self, ej_send):
+        tracker = tracker_with_tokens(token_expiring_in(EJ_TOKEN_REFRESH_MARGIN - 1))
+        ej_send.side_effect = [
+            EjResponse(200, b'{"access": "new_access", "refresh": "new_refresh"}'),
+            EjResponse(200, b"{}"),
+        ]
+        await EjClient(tracker).request(conversation_route(CONVERSATION_ID))
+        refresh_call, request_call = ej_send.call_args_list
+        assert refresh_call.args[1] == refresh_token_route()
+        assert request_call.args[2] == auth_headers("new_access")
+        assert tracker.get_slot("access_token") == "new_access"
+        assert tracker.get_slot("refresh_token") == "new_refresh"
+
+    @pytest.mark.asyncio
+    async def test_valid_token_is_not_refreshed(self, ej_send):
+        access_token = token_expiring_in(EJ_TOKEN_REFRESH_MARGIN + 60)
+        tracker = tracker_with_tokens(access_token)
+        ej_send.return_value = EjResponse(200, b"{}")
+        await EjClient(tracker).request(conversation_route(CONVERSATION_ID))
+        ej_send.assert_called_once()
+        assert ej_send.call_args.args[2] == auth_headers(access_token)
+
+    @pytest.mark.asyncio
+    async def test_concurrent_refreshes_are_coalesced(self, ej_send):
+        async def refresh(*args, **kwargs):
+            await asyncio.sleep(0)
+            return EjResponse(200, b'{"access": "new_access"}')
+
+        ej_send.side_effect = refresh
+        trackers = [tracker_with_tokens("expired") for _ in range(3)]
+        await asyncio.gather(
+            *[EjClient(tracker)._refresh_access_token() for tracker in trackers]
+        )
+        ej_send.assert_called_once()
+        for tracker in trackers:
+            assert tracker.get_slot("access_token") == "new_access"
+            assert tracker.get_slot("refresh_token") == "refresh"
+
+    @pytest.mark.asyncio
+    async def test_failed_refresh_raises_communication_error(self, ej_send):
+        tracker = tracker_with_tokens(token_expiring_in(EJ_TOKEN_REFRESH_MARGIN - 1))
+        ej_send.return_value = EjResponse(401, b"{}")
+        with pytest.raises(EJCommunicationError):
+            await EjClient(tracker).request(conversation_route(CONVERSATION_ID))
+        ej_send.assert_called_once()
 
 
 class TestEjUrlsGenerationClass:
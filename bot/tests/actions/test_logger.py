@@ -0,0 +1,81 @@
+import logging
+from unittest.mock import Mock, patch
+
+from actions.logger import (
+    LOG_SENDER_ID,
+    REDACTED,
+    LogData,
+    custom_logger,
+    is_sampled,
+    log_metrics,
+    redact,
+)
+from ej.metrics import METRICS
+from ej.user import User
+from ej.vote import Vote
+
+
+class TestCustomLogger:
+    def test_nothing_is_formatted_when_debug_is_disabled(self, caplog):
+        caplog.set_level(logging.INFO, logger="actions.logger")
+        data = Mock(return_value={"votes": 1})
+        custom_logger("STATISTICS", data=data)
+        data.assert_not_called()
+        assert not caplog.records
+
+    def test_data_is_formatted_when_written(self, caplog):
+        caplog.set_level(logging.DEBUG, logger="actions.logger")
+        custom_logger("STATISTICS", data=lambda: {"votes": 1})
+        assert '"votes": 1' in caplog.text
+
+    def test_credentials_are_redacted(self, caplog, tracker):
+        caplog.set_level(logging.DEBUG, logger="actions.logger")
+        user = User(tracker)
+        custom_logger("AUTH", data=user.auth_data)
+        assert user.password not in caplog.text
+        assert user.secret_id not in caplog.text
+        assert REDACTED in caplog.text
+        assert user.name in caplog.text
+
+    def test_vote_repr_has_no_tokens(self, tracker):
+        vote = repr(Vote("1", tracker))
+        assert "1234" not in vote
+        assert "5678" not in vote
+
+    def test_redact(self):
+        data = {"access": "a", "items": [{"refresh_token": "r", "id": 1}]}
+        assert redact(data) == {
+            "access": REDACTED,
+            "items": [{"refresh_token": REDACTED, "id": 1}],
+        }
+
+    def test_plain_text_data(self):
+        assert str(LogData("not json")) == "not json"
+
+    def test_participants_are_sampled(self, caplog):
+        caplog.set_level(logging.DEBUG, logger="actions.logger")
+        with patch("actions.logger.EJ_LOG_SAMPLE_RATE", 0.5):
+            sampled = [is_sampled(f"sender-{i}") for i in range(1000)]
+            assert 400 < sum(sampled) < 600
+            assert is_sampled("sender-1") == is_sampled("sender-1")
+
+        with patch("actions.logger.EJ_LOG_SAMPLE_RATE", 0):
+            token = LOG_SENDER_ID.set("sender")
+            custom_logger("NOT SAMPLED")
+            LOG_SENDER_ID.reset(token)
+            custom_logger("WITHOUT PARTICIPANT")
+        assert "NOT SAMPLED" not in caplog.text
+        assert "WITHOUT PARTICIPANT" in caplog.text
+
+    def test_metrics_are_logged_periodically(self, caplog):
+        caplog.set_level(logging.INFO, logger="actions.logger")
+        METRICS.increment("ej_action_budget_exceeded", action="action_ask_vote")
+        with patch("actions.logger.EJ_METRICS_LOG_INTERVAL", 60), patch(
+            "actions.logger._metrics_logged_at", 0
+        ), patch("actions.logger.time.monotonic", side_effect=[100, 130, 160]):
+            log_metrics()
+            log_metrics()
+            log_metrics()
+        records = [r for r in caplog.records if "METRICS" in r.getMessage()]
+        assert len(records) == 2
+        assert "ej_action_budget_exceeded{action=action_ask_vote}" in caplog.text
@@ -0,0 +1,113 @@
+import json
+import os
+import stat
+import time
+from unittest.mock import patch
+
+import jwt
+import pytest
+from rasa_sdk import Tracker
+
+from bot.ej.ej_client import EjResponse
+from bot.ej.metrics import METRICS
+from bot.ej.preregister_participants import preregister, read_contacts
+from bot.ej.preregistration import PreregistrationStore
+from bot.ej.user import User
+
+TOKENS = (
+    b'{"access_token": "a", "refresh_token": "r", "has_completed_registration": false}'
+)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = PreregistrationStore(str(tmp_path / "preregistered.sqlite3"))
+    yield store
+    store.connection.close()
+
+
+def contact(phone, name="Participant"):
+    return {"phone": phone, "name": name}
+
+
+class TestPreregistrationStore:
+    def test_tokens_are_taken_once(self, store):
+        store.add("5561999999999", json.loads(TOKENS))
+        assert store.take("5561999999999")["access_token"] == "a"
+        assert store.take("5561999999999") is None
+        assert store.sender_ids() == {"5561999999999"}
+
+    def test_expired_tokens_are_not_taken(self, store):
+        METRICS.reset()
+        tokens = json.loads(TOKENS)
+        tokens["refresh_token"] = jwt.encode({"exp": time.time() - 1}, "secret" * 6)
+        store.add("5561999999999", tokens)
+        tokens["refresh_token"] = jwt.encode({"exp": time.time() + 60}, "secret" * 6)
+        store.add("5561888888888", tokens)
+        assert store.take("5561999999999") is None
+        assert METRICS.get("ej_preregistration_expired") == 1
+        assert store.take("5561888888888")["access_token"] == "a"
+
+    def test_database_is_only_readable_by_its_owner(self, store):
+        store.add("5561999999999", json.loads(TOKENS))
+        assert stat.S_IMODE(os.stat(store.path).st_mode) == 0o600
+
+    def test_missing_database_is_not_created(self, tmp_path):
+        store = PreregistrationStore(str(tmp_path / "missing.sqlite3"))
+        assert store.take("5561999999999") is None
+        assert not (tmp_path / "missing.sqlite3").exists()
+
+
+class TestPreregister:
+    def test_read_contacts(self, tmp_path):
+        contacts_path = tmp_path / "contacts.csv"
+        contacts_path.write_text("phone,name\n5561999999999, Maria \n,nobody\n")
+        assert read_contacts(str(contacts_path)) == [contact("5561999999999", "Maria")]
+
+    @pytest.mark.asyncio
+    async def test_contacts_are_registered_with_their_names(self, store, ej_send):
+        ej_send.return_value = EjResponse(201, TOKENS)
+        await preregister([contact("5561999999999", "Maria")], store)
+        assert json.loads(ej_send.call_args.args[3])["name"] == "Maria"
+        assert store.take("5561999999999")["refresh_token"] == "r"
+
+    @pytest.mark.asyncio
+    async def test_registered_contacts_are_skipped(self, store, ej_send):
+        METRICS.reset()
+        store.add("5561999999999", json.loads(TOKENS))
+        ej_send.return_value = EjResponse(201, TOKENS)
+        await preregister([contact("5561999999999"), contact("5561888888888")], store)
+        ej_send.assert_called_once()
+        assert METRICS.get("ej_preregistration_skipped") == 1
+        assert METRICS.get("ej_preregistration_registered") == 1
+
+    @pytest.mark.asyncio
+    async def test_failed_contacts_are_not_stored(self, store, ej_send):
+        METRICS.reset()
+        ej_send.return_value = EjResponse(400, b"{}")
+        await preregister([contact("5561999999999")], store)
+        assert store.sender_ids() == set()
+        assert METRICS.get("ej_preregistration_failed") == 1
+
+    @pytest.mark.asyncio
+    async def test_first_message_uses_the_stored_tokens(self, store, ej_send):
+        store.add("5561999999999", json.loads(TOKENS))
+        slots = {"access_token": None, "refresh_token": None}
+        tracker = Tracker("5561999999999", slots, {}, [], False, None, {}, "")
+        with patch("bot.ej.user.PREREGISTERED_PARTICIPANTS", store):
+            await User(tracker).authenticate()
+        ej_send.assert_not_called()
+        assert tracker.slots["access_token"] == "a"
+
+    @pytest.mark.asyncio
+    async def test_expired_tokens_fall_back_to_the_authentication(self, store, ej_send):
+        tokens = json.loads(TOKENS)
+        tokens["refresh_token"] = jwt.encode({"exp": time.time() - 1}, "secret" * 6)
+        store.add("5561999999999", tokens)
+        ej_send.return_value = EjResponse(201, TOKENS.replace(b'"a"', b'"new"'))
+        slots = {"access_token": None, "refresh_token": None}
+        tracker = Tracker("5561999999999", slots, {}, [], False, None, {}, "")
+        with patch("bot.ej.user.PREREGISTERED_PARTICIPANTS", store):
+            await User(tracker).authenticate()
+        ej_send.assert_called_once()
+        assert tracker.slots["access_token"] == "new"
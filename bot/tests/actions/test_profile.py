@@ -1,15 +1,22 @@
+import json
+import os
+
 import pytest
-from unittest.mock import Mock, patch
+from unittest.mock import AsyncMock, Mock
+from bot.ej.cache import PROFILE_CACHE
 from bot.ej.profile import (
     Profile,
     Question,
+    QuestionBank,
     Gender,
 )
 
+from .conftest import mock_json_content
+
 
 # Test initialization of the Profile object
 def test_profile_initialization(mock_profile):
-    assert isinstance(mock_profile.questions, list)
+    assert isinstance(mock_profile.questions, tuple)
     assert isinstance(mock_profile.remaining_questions, list)
 
 
@@ -26,9 +33,9 @@ def test_set_remaining_questions(mock_profile):
 
 
 # Test validation of a valid answer
-@patch("bot.ej.ej_client.requests.post")
-def test_is_valid_answer_valid(mock_post):
-    mock_post.return_value = Mock(ok=True)
+@pytest.mark.asyncio
+async def test_is_valid_answer_valid(ej_send):
+    ej_send.return_value = Mock(ok=True)
     mock_profile = Mock(spec=Profile)
     mock_profile.questions = [
         Question(
@@ -39,25 +46,20 @@ def test_is_valid_answer_valid(mock_post):
             put_payload="gender",
         )
     ]
-    mock_profile.is_valid_answer.return_value = (True, None)
+    mock_profile.is_valid_answer = AsyncMock(return_value=(True, None))
 
-    is_valid, err = mock_profile.is_valid_answer(1, 1)
+    is_valid, err = await mock_profile.is_valid_answer(1, 1)
     assert is_valid is True
     assert err is None
 
 
 # Test validation of an invalid answer
-def test_is_valid_answer_invalid(mock_profile):
-    mock_profile.questions = [
-        Question(
-            id=1,
-            body="What is your gender?",
-            answers=[{"payload": 1, "title": "Female"}],
-            change=Gender,
-            put_payload="gender",
-        )
-    ]
-    is_valid, err = mock_profile.is_valid_answer(2, 1)
+@pytest.mark.asyncio
+async def test_is_valid_answer_invalid(mock_profile):
+    is_valid, err = await mock_profile.is_valid_answer(4, 1)
+    assert is_valid is False
+    assert err is None
+    is_valid, err = await mock_profile.is_valid_answer(1, 99)
     assert is_valid is False
     assert err is None
 
@@ -94,3 +96,57 @@ def test_need_to_ask_about_profile(
     )
     assert should_ask is False
     assert next_count == -1
+
+
+def test_question_bank_is_indexed():
+    question_bank = QuestionBank.load()
+    assert question_bank is QuestionBank.load()
+    assert [q.id for q in question_bank.questions] == sorted(question_bank.by_id)
+    gender_question = question_bank.by_change[Gender][0]
+    assert question_bank.by_id[gender_question.id] is gender_question
+    assert gender_question.payloads == {
+        answer["payload"] for answer in gender_question.answers
+    }
+
+
+def test_question_bank_is_reloaded_when_file_changes(tmp_path):
+    questions_file = tmp_path / "profile-questions.json"
+    questions_file.write_text(mock_json_content)
+    question_bank = QuestionBank.load(str(questions_file))
+    assert QuestionBank.load(str(questions_file)) is question_bank
+
+    data = json.loads(mock_json_content)
+    data["random_questions"] = True
+    questions_file.write_text(json.dumps(data))
+    os.utime(questions_file, ns=(0, 0))
+    reloaded = QuestionBank.load(str(questions_file))
+    assert reloaded is not question_bank
+    assert reloaded.random_questions
+
+
+@pytest.mark.asyncio
+async def test_profile_snapshot_is_cached(ej_send, tracker, mock_ej_client_response):
+    ej_send.return_value = Mock(status_code=200)
+    ej_send.return_value.json.return_value = mock_ej_client_response
+    await Profile.get(tracker)
+    profile = await Profile.get(tracker)
+    ej_send.assert_called_once()
+    assert profile.user == mock_ej_client_response["user"]
+
+
+@pytest.mark.asyncio
+async def test_profile_snapshot_is_updated_by_answers(
+    ej_send, tracker, mock_ej_client_response
+):
+    ej_send.return_value = Mock(status_code=200)
+    ej_send.return_value.json.return_value = mock_ej_client_response
+    profile = await Profile.get(tracker)
+    question = profile.question_bank.by_change[Gender][0]
+    answer = max(question.payloads)
+    ej_send.return_value.json.return_value = {"gender": answer}
+    is_valid, _ = await profile.is_valid_answer(answer, question.id)
+    assert is_valid
+    assert PROFILE_CACHE.get(tracker.sender_id)["gender"] == answer
+    profile = await Profile.get(tracker)
+    assert question not in profile.remaining_questions
+    assert ej_send.call_count == 2
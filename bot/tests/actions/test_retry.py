@@ -0,0 +1,173 @@
+from unittest.mock import patch
+
+import aiohttp
+import pytest
+
+from bot.ej.ej_client import EjClient, get_route_timeout
+from bot.ej.metrics import METRICS
+from bot.ej.retry import Deadline, RetryPolicy, action_deadline, with_deadline
+from bot.ej.routes import (
+    conversation_route,
+    random_comment_route,
+    registration_route,
+    user_statistics_route,
+)
+from bot.ej.settings import (
+    EJ_HTTP_FAST_READ_TIMEOUT,
+    EJ_HTTP_READ_TIMEOUT,
+    EJ_HTTP_SLOW_READ_TIMEOUT,
+    EJCommunicationError,
+    EJDeadlineExceededError,
+)
+
+URL = "http://ej.test/api/v1/conversations/1/"
+NO_WAIT_POLICY = RetryPolicy(retries=2, base_delay=0, max_delay=0)
+
+
+class FakeResponse:
+    def __init__(self, status):
+        self.status = status
+
+    async def read(self):
+        return b"{}"
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+
+class FakeSession:
+    """Returns (or raises) the given outcomes, one per request."""
+
+    def __init__(self):
+        self.outcomes = []
+        self.calls = 0
+
+    def request(self, method, url, **kwargs):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return FakeResponse(outcome)
+
+
+@pytest.fixture
+def fake_session():
+    session = FakeSession()
+    with patch("bot.ej.ej_client.get_session", return_value=session), patch(
+        "bot.ej.ej_client.RETRY_POLICY", NO_WAIT_POLICY
+    ):
+        yield session
+
+
+class TestRetryPolicy:
+    def test_backoff_is_bounded(self):
+        policy = RetryPolicy(retries=5, base_delay=0.5, max_delay=2)
+        for attempt in range(6):
+            assert 0 <= policy.backoff(attempt) <= min(2, 0.5 * 2**attempt)
+
+    @pytest.mark.asyncio
+    async def test_wait_respects_deadline(self):
+        policy = RetryPolicy(retries=1, base_delay=1, max_delay=1)
+        with patch("bot.ej.retry.random.uniform", return_value=1):
+            with pytest.raises(EJDeadlineExceededError):
+                await policy.wait(0, Deadline(budget=0.5))
+
+    @pytest.mark.asyncio
+    async def test_idempotent_request_is_retried(self, fake_session):
+        fake_session.outcomes = [503, 200]
+        response = await EjClient(None)._send("GET", URL)
+        assert response.status_code == 200
+        assert fake_session.calls == 2
+
+    @pytest.mark.asyncio
+    async def test_connection_errors_are_retried(self, fake_session):
+        fake_session.outcomes = [aiohttp.ClientConnectionError(), 200]
+        response = await EjClient(None)._send("PUT", URL, payload="{}")
+        assert response.status_code == 200
+        assert fake_session.calls == 2
+
+    @pytest.mark.asyncio
+    async def test_unsafe_request_is_not_retried(self, fake_session):
+        fake_session.outcomes = [aiohttp.ClientConnectionError(), 200]
+        with pytest.raises(EJCommunicationError):
+            await EjClient(None)._send("POST", URL, payload="{}")
+        assert fake_session.calls == 1
+
+    @pytest.mark.asyncio
+    async def test_retry_safe_request_is_retried(self, fake_session):
+        fake_session.outcomes = [503, 201]
+        response = await EjClient(None)._send(
+            "POST", URL, payload="{}", retry_safe=True
+        )
+        assert response.status_code == 201
+        assert fake_session.calls == 2
+
+
+class TestDeadline:
+    @pytest.mark.asyncio
+    async def test_deadline_is_shared_by_nested_calls(self):
+        @with_deadline(budget=5)
+        async def inner():
+            return Deadline.current()
+
+        @with_deadline(budget=10)
+        async def outer():
+            return Deadline.current(), await inner()
+
+        outer_deadline, inner_deadline = await outer()
+        assert outer_deadline is inner_deadline
+        assert outer_deadline.budget == 10
+        assert Deadline.current() is None
+
+    @pytest.mark.asyncio
+    async def test_expired_deadline_stops_requests(self, fake_session):
+        fake_session.outcomes = [200]
+
+        @with_deadline(budget=0)
+        async def action():
+            await EjClient(None)._send("GET", URL)
+
+        with pytest.raises(EJDeadlineExceededError):
+            await action()
+        assert fake_session.calls == 0
+
+    def test_exceeded_budget_is_recorded(self):
+        METRICS.reset()
+        with action_deadline(budget=0, action="action_ask_vote"):
+            with action_deadline(budget=10, action="nested_action"):
+                pass
+        assert METRICS.get("ej_action_budget_exceeded", action="action_ask_vote") == 1
+        assert METRICS.get("ej_action_budget_exceeded", action="nested_action") == 0
+        with action_deadline(budget=10, action="action_ask_vote"):
+            pass
+        assert METRICS.get("ej_action_budget_exceeded", action="action_ask_vote") == 1
+        durations = METRICS.snapshot()["durations"]
+        assert (
+            durations["ej_action_duration_seconds{action=action_ask_vote}"]["count"]
+            == 2
+        )
+
+
+class TestRouteTimeout:
+    def test_vote_routes_have_tight_read_timeout(self):
+        assert get_route_timeout(random_comment_route(1)).sock_read == (
+            EJ_HTTP_FAST_READ_TIMEOUT
+        )
+        assert get_route_timeout(user_statistics_route(1)).sock_read == (
+            EJ_HTTP_FAST_READ_TIMEOUT
+        )
+
+    def test_registration_has_loose_read_timeout(self):
+        assert get_route_timeout(registration_route()).sock_read == (
+            EJ_HTTP_SLOW_READ_TIMEOUT
+        )
+        assert get_route_timeout(conversation_route(1)).sock_read == (
+            EJ_HTTP_READ_TIMEOUT
+        )
+
+    def test_total_timeout_is_bounded_by_deadline(self):
+        assert get_route_timeout(URL).total is None
+        assert get_route_timeout(URL, Deadline(budget=3)).total <= 3
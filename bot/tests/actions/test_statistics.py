@@ -0,0 +1,42 @@
+from bot.ej.settings import EJ_STATISTICS_RECONCILE_EVERY
+from bot.ej.statistics import (
+    ParticipationCounters,
+    count_vote,
+    get_participation_counters,
+    set_participation_counters,
+)
+
+
+def get_statistics():
+    return {
+        "votes": 2,
+        "missing_votes": 8,
+        "participation_ratio": 0.2,
+        "total_comments": 10,
+        "comments": 2,
+    }
+
+
+class TestParticipationCounters:
+    def test_vote_updates_counters(self):
+        counters = ParticipationCounters(get_statistics())
+        assert counters.count_vote()
+        assert counters.statistics["votes"] == 3
+        assert counters.statistics["comments"] == 3
+        assert counters.statistics["missing_votes"] == 7
+        assert counters.statistics["participation_ratio"] == 0.3
+
+    def test_counters_are_reconciled_every_n_votes(self):
+        set_participation_counters("sender", 1, get_statistics())
+        for _ in range(EJ_STATISTICS_RECONCILE_EVERY - 1):
+            count_vote("sender", 1)
+            assert get_participation_counters("sender", 1)
+        count_vote("sender", 1)
+        assert get_participation_counters("sender", 1) is None
+
+    def test_wrong_counters_are_reconciled(self):
+        set_participation_counters(
+            "sender", 1, {**get_statistics(), "missing_votes": 0}
+        )
+        count_vote("sender", 1)
+        assert get_participation_counters("sender", 1) is None
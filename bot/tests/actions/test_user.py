@@ -1,9 +1,26 @@
+import hashlib
+import hmac
 import json
-from bot.ej.settings import SECRET_KEY
+import time
+from unittest.mock import patch
+
+import jwt
+
+from bot.ej.settings import SECRET_KEY, TOKEN_EXPIRATION_TIME, EJCommunicationError
 import pytest
+from rasa_sdk import Tracker
 
-from bot.ej.auth import CheckAuthenticationDialogue
-from bot.ej.user import User
+from bot.ej.auth import (
+    CheckAuthenticationDialogue,
+    ExternalAuthenticationManager,
+    InvalidWebhookNotification,
+    read_webhook_notification,
+    verify_webhook_signature,
+)
+from bot.ej.ej_client import EjResponse
+from bot.ej.metrics import METRICS
+from bot.ej.routes import auth_route, registration_route
+from bot.ej.user import User, get_user_credentials
 
 
 class TestCheckAuthenticationDialogue:
@@ -36,6 +53,113 @@ class TestCheckAuthenticationDialogue:
         assert slots["has_completed_registration"] == False
 
 
+class TestExternalAuthenticationManager:
+    @pytest.fixture(autouse=True)
+    def external_authentication(self):
+        with patch("bot.ej.auth.EXTERNAL_AUTHENTICATION_HOST", "https://bp"), patch(
+            "bot.ej.auth.BP_EJ_COMPONENT_ID", "processes/1/f/2"
+        ), patch("bot.ej.auth.JWT_SECRET", "test-secret" * 4):
+            yield
+
+    def test_authentication_link_is_signed_once(self):
+        with patch.object(
+            ExternalAuthenticationManager,
+            "_get_jwt_authorization_data",
+            side_effect=["first", "second"],
+        ) as sign:
+            link = ExternalAuthenticationManager("sender", "secret")
+            other_link = ExternalAuthenticationManager("sender", "other")
+            assert link.get_authentication_link().endswith("?user_data=first")
+            assert link.get_authentication_link().endswith("?user_data=first")
+            assert other_link.get_authentication_link().endswith("?user_data=second")
+            assert sign.call_count == 2
+
+    def test_expired_authentication_link_is_signed_again(self):
+        manager = ExternalAuthenticationManager("sender", "secret")
+        link = manager.get_authentication_link()
+        with patch(
+            "bot.ej.cache.time.monotonic",
+            return_value=time.monotonic() + TOKEN_EXPIRATION_TIME.total_seconds(),
+        ):
+            with patch.object(
+                ExternalAuthenticationManager,
+                "_get_jwt_authorization_data",
+                return_value="new",
+            ):
+                assert manager.get_authentication_link() != link
+
+    def test_authorization_data_round_trip(self):
+        secret_id = ExternalAuthenticationManager.to_sha256("sender")
+        jwt_data = ExternalAuthenticationManager(
+            "sender", secret_id
+        )._get_jwt_authorization_data()
+        manager = ExternalAuthenticationManager.from_authorization_data(jwt_data)
+        assert manager == ExternalAuthenticationManager("sender", secret_id)
+
+    def test_invalid_authorization_data(self):
+        jwt_data = ExternalAuthenticationManager(
+            "sender", "not the sender hash"
+        )._get_jwt_authorization_data()
+        with pytest.raises(jwt.InvalidTokenError):
+            ExternalAuthenticationManager.from_authorization_data(jwt_data)
+
+        expired = ExternalAuthenticationManager(
+            "sender", ExternalAuthenticationManager.to_sha256("sender")
+        )._get_jwt_authorization_data(expiration_minutes=-1)
+        with pytest.raises(jwt.ExpiredSignatureError):
+            ExternalAuthenticationManager.from_authorization_data(expired)
+
+        with pytest.raises(jwt.InvalidTokenError):
+            ExternalAuthenticationManager.from_authorization_data(
+                jwt.encode({"user_id": "sender"}, "other-secret" * 4)
+            )
+
+    def test_webhook_signature(self):
+        body = b'{"user_data": "jwt"}'
+        digest = hmac.new(b"webhook-secret", body, hashlib.sha256).hexdigest()
+        signature = f"sha256={digest}"
+        assert verify_webhook_signature("webhook-secret", body, signature)
+        assert not verify_webhook_signature("webhook-secret", body, None)
+        assert not verify_webhook_signature("webhook-secret", body, "jwt")
+        assert not verify_webhook_signature("other-secret", body, signature)
+        assert not verify_webhook_signature(
+            "webhook-secret", b'{"user_data": "other jwt"}', signature
+        )
+        # without a configured secret, every notification is rejected.
+        assert not verify_webhook_signature(None, body, signature)
+        assert not verify_webhook_signature("", body, signature)
+
+    def test_read_webhook_notification(self):
+        def sign(body):
+            digest = hmac.new(b"webhook-secret", body, hashlib.sha256).hexdigest()
+            return f"sha256={digest}"
+
+        manager = ExternalAuthenticationManager(
+            "sender", ExternalAuthenticationManager.to_sha256("sender")
+        )
+        body = json.dumps({"user_data": manager._get_jwt_authorization_data()}).encode()
+        assert read_webhook_notification("webhook-secret", body, sign(body)) == manager
+
+        with pytest.raises(InvalidWebhookNotification, match="signature"):
+            read_webhook_notification("webhook-secret", body, None)
+        for invalid_body in (b'{"user_data": "not a jwt"}', b"{}", b"not json"):
+            with pytest.raises(InvalidWebhookNotification, match="user_data"):
+                read_webhook_notification(
+                    "webhook-secret", invalid_body, sign(invalid_body)
+                )
+
+    def test_webhook_channel_reads_its_secret_from_the_credentials(self):
+        # the addon depends on rasa, which is only installed with the bot.
+        addon = pytest.importorskip("addons.external_authentication")
+        channel = addon.ExternalAuthentication.from_credentials(
+            {"webhook_secret": "webhook-secret"}
+        )
+        assert channel.webhook_secret == "webhook-secret"
+        assert (
+            addon.ExternalAuthentication.from_credentials(None).webhook_secret is None
+        )
+
+
 class TestUser:
     def test_get_password_hash(self, tracker):
         import base64
@@ -61,6 +185,23 @@ class TestUser:
         assert user._get_password() == password
         assert len(user._get_password()) == 64
 
+    def test_base64_ruby_compatible_format(self):
+        assert User.get_base64_ruby_compatible_format("") == "\n"
+        assert User.get_base64_ruby_compatible_format("a" * 59) == "a" * 59 + "\n"
+        assert User.get_base64_ruby_compatible_format("a" * 60) == "a" * 60 + "\n\n"
+        assert (
+            User.get_base64_ruby_compatible_format("a" * 125)
+            == "a" * 60 + "\n" + "a" * 60 + "\n" + "a" * 5 + "\n"
+        )
+
+    def test_credentials_are_derived_once(self, tracker):
+        get_user_credentials.cache_clear()
+        User(tracker)
+        user = User(tracker)
+        assert get_user_credentials.cache_info().hits == 1
+        assert user.password == user._get_password()
+        assert user.email == "5561981178174-opinion-bot@mail.com"
+
     def test_generate_password(self, tracker):
         user = User(tracker)
         assert user.password == user._get_password()
@@ -93,3 +234,73 @@ class TestUser:
     def test_get_username_from_tracker_on_whatsapp_channel(self, wpp_tracker):
         user = User(wpp_tracker)
         assert user.name == "David Carlos"
+
+
+TOKENS = (
+    b'{"access_token": "a", "refresh_token": "r", "has_completed_registration": false}'
+)
+
+
+def tracker_without_tokens():
+    slots = {"access_token": None, "refresh_token": None}
+    return Tracker("+5561981178174", slots, {}, [], False, None, {}, "action_listen")
+
+
+class TestAuthentication:
+    @pytest.mark.asyncio
+    async def test_new_participant_is_registered_first(self, ej_send):
+        METRICS.reset()
+        ej_send.return_value = EjResponse(201, TOKENS)
+        tracker = tracker_without_tokens()
+        await User(tracker).authenticate()
+        ej_send.assert_called_once()
+        assert ej_send.call_args.args[1] == registration_route()
+        assert tracker.slots["access_token"] == "a"
+        assert METRICS.get("ej_authentication_path", path="registration") == 1
+
+    @pytest.mark.asyncio
+    async def test_known_participant_is_authenticated_first(self, ej_send):
+        METRICS.reset()
+        ej_send.return_value = EjResponse(201, TOKENS)
+        await User(tracker_without_tokens()).authenticate()
+        ej_send.reset_mock()
+        ej_send.return_value = EjResponse(200, TOKENS)
+        tracker = tracker_without_tokens()
+        await User(tracker).authenticate()
+        ej_send.assert_called_once()
+        assert ej_send.call_args.args[1] == auth_route()
+        assert tracker.slots["refresh_token"] == "r"
+        assert METRICS.get("ej_authentication_path", path="auth") == 1
+
+    @pytest.mark.asyncio
+    async def test_unknown_registered_participant_falls_back_to_auth(self, ej_send):
+        METRICS.reset()
+        ej_send.side_effect = [
+            EjResponse(400, b'{"email": ["already registered"]}'),
+            EjResponse(200, TOKENS),
+        ]
+        tracker = tracker_without_tokens()
+        await User(tracker).authenticate()
+        assert [call.args[1] for call in ej_send.call_args_list] == [
+            registration_route(),
+            auth_route(),
+        ]
+        assert tracker.slots["access_token"] == "a"
+        assert METRICS.get("ej_authentication_fallbacks", path="registration") == 1
+
+    @pytest.mark.asyncio
+    async def test_participant_not_authenticated(self, ej_send):
+        ej_send.return_value = EjResponse(400, b"{}")
+        with pytest.raises(EJCommunicationError):
+            await User(tracker_without_tokens()).authenticate()
+
+    @pytest.mark.asyncio
+    async def test_communication_errors_are_not_retried_as_registration(self, ej_send):
+        ej_send.return_value = EjResponse(201, TOKENS)
+        await User(tracker_without_tokens()).authenticate()
+        ej_send.reset_mock()
+        ej_send.side_effect = EJCommunicationError
+        with pytest.raises(EJCommunicationError):
+            await User(tracker_without_tokens()).authenticate()
+        ej_send.assert_called_once()
+        assert ej_send.call_args.args[1] == auth_route()
@@ -0,0 +1,126 @@
+import json
+import os
+import sqlite3
+import stat
+from unittest.mock import patch
+
+import pytest
+
+from bot.ej.ej_client import EjResponse
+from bot.ej.metrics import METRICS
+from bot.ej.routes import votes_route
+from bot.ej.settings import EJCommunicationError
+from bot.ej.vote import Vote
+from bot.ej.vote_outbox import VoteOutbox
+
+
+@pytest.fixture
+def outbox(tmp_path):
+    outbox = VoteOutbox(str(tmp_path / "outbox.sqlite3"))
+    yield outbox
+    outbox.connection.close()
+    outbox._executor.shutdown()
+
+
+async def add_vote(outbox, sender_id="sender", comment_id=1, choice=1):
+    await outbox.add(sender_id, 1, comment_id, choice, "telegram", "access", "refresh")
+
+
+class TestVoteOutbox:
+    @pytest.mark.asyncio
+    async def test_votes_are_durable(self, outbox):
+        await add_vote(outbox)
+        assert VoteOutbox(outbox.path).depth() == 1
+        assert stat.S_IMODE(os.stat(outbox.path).st_mode) == 0o600
+
+    @pytest.mark.asyncio
+    async def test_participant_has_a_single_vote_per_comment(self, outbox):
+        await add_vote(outbox, choice=1)
+        await add_vote(outbox, choice=-1)
+        (vote,) = outbox.pending()["sender"]
+        assert vote.choice == -1
+
+    @pytest.mark.asyncio
+    async def test_depth_and_age_metrics(self, outbox):
+        await add_vote(outbox, comment_id=1)
+        await add_vote(outbox, comment_id=2)
+        assert METRICS.get("ej_vote_outbox_depth") == 2
+        assert METRICS.get("ej_vote_outbox_oldest_age_seconds") >= 0
+
+    @pytest.mark.asyncio
+    async def test_flush_sends_votes_in_order(self, outbox, ej_send):
+        for comment_id in (1, 2, 3):
+            await add_vote(outbox, comment_id=comment_id)
+        ej_send.return_value = EjResponse(201, b"{}")
+        await outbox.flush()
+        assert outbox.depth() == 0
+        sent = [json.loads(call.args[3])["comment"] for call in ej_send.call_args_list]
+        assert sent == ["1", "2", "3"]
+        assert ej_send.call_args.args[1] == votes_route()
+
+    @pytest.mark.asyncio
+    async def test_failed_vote_holds_the_following_ones(self, outbox, ej_send):
+        await add_vote(outbox, comment_id=1)
+        await add_vote(outbox, comment_id=2)
+        await add_vote(outbox, sender_id="other", comment_id=1)
+        ej_send.side_effect = [EjResponse(503), EjResponse(201)]
+        await outbox.flush()
+        pending = outbox.pending()
+        assert [vote.comment_id for vote in pending["sender"]] == ["1", "2"]
+        assert pending["sender"][0].attempts == 1
+        assert "other" not in pending
+
+    @pytest.mark.asyncio
+    async def test_refreshed_tokens_are_kept_for_the_next_attempts(
+        self, outbox, ej_send
+    ):
+        await add_vote(outbox)
+        tokens = b'{"access": "new access", "refresh": "new refresh"}'
+        ej_send.side_effect = [
+            EjResponse(401),
+            EjResponse(200, tokens),
+            EjResponse(503),
+        ]
+        await outbox.flush()
+        (vote,) = outbox.pending()["sender"]
+        assert (vote.access_token, vote.refresh_token) == ("new access", "new refresh")
+
+    @pytest.mark.asyncio
+    async def test_votes_of_a_previous_run_are_flushed_on_resume(self, outbox, ej_send):
+        await add_vote(outbox)
+        ej_send.return_value = EjResponse(201, b"{}")
+        restarted_outbox = VoteOutbox(outbox.path)
+        restarted_outbox.resume()
+        flusher = restarted_outbox._flusher
+        await flusher
+        restarted_outbox.resume()
+        assert restarted_outbox._flusher is flusher
+        assert outbox.depth() == 0
+        restarted_outbox.connection.close()
+        restarted_outbox._executor.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_rejected_votes_are_removed(self, outbox, ej_send):
+        await add_vote(outbox)
+        ej_send.return_value = EjResponse(400)
+        await outbox.flush()
+        assert outbox.depth() == 0
+
+    @pytest.mark.asyncio
+    async def test_vote_is_confirmed_before_it_is_sent(self, outbox, tracker, ej_send):
+        with patch("bot.ej.vote.EJ_VOTE_OUTBOX", True), patch(
+            "bot.ej.vote.VOTE_OUTBOX", outbox
+        ), patch.object(outbox, "start_flusher") as start_flusher:
+            response = await Vote("1", tracker).create("10")
+        assert response == {"comment": "10", "choice": 1}
+        start_flusher.assert_called_once()
+        ej_send.assert_not_called()
+        assert outbox.depth() == 1
+
+    @pytest.mark.asyncio
+    async def test_outbox_errors_are_communication_errors(self, outbox, tracker):
+        with patch("bot.ej.vote.EJ_VOTE_OUTBOX", True), patch(
+            "bot.ej.vote.VOTE_OUTBOX", outbox
+        ), patch.object(outbox, "insert", side_effect=sqlite3.OperationalError):
+            with pytest.raises(EJCommunicationError):
+                await Vote("1", tracker).create("10")
@@ -0,0 +1,54 @@
+"""
+Micro-benchmark of the User construction, which happens on almost every action.
+
+    cd bot && python -m tests.benchmark_user
+"""
+
+import timeit
+
+from rasa_sdk import Tracker
+
+from ej.user import User
+
+ROUNDS = 10000
+
+
+def build_tracker(sender_id: str) -> Tracker:
+    return Tracker(
+        sender_id,
+        {"has_completed_registration": False},
+        {"metadata": {"contact_name": "participant"}},
+        [],
+        False,
+        None,
+        {},
+        "",
+    )
+
+
+def main():
+    # The same participants are seen again and again along their conversations.
+    trackers = [build_tracker(f"+55619811{i:05}") for i in range(100)]
+
+    def build_users():
+        for tracker in trackers:
+            User(tracker)
+
+    seconds = min(timeit.repeat(build_users, number=ROUNDS // len(trackers), repeat=5))
+    print(f"User(tracker): {seconds / ROUNDS * 1e6:.2f} us per call")
+
+    seed = "a" * 192
+    seconds = min(
+        timeit.repeat(
+            lambda: User.get_base64_ruby_compatible_format(seed),
+            number=ROUNDS,
+            repeat=5,
+        )
+    )
+    print(
+        f"get_base64_ruby_compatible_format: {seconds / ROUNDS * 1e6:.2f} us per call"
+    )
+
+
+if __name__ == "__main__":
+    main()